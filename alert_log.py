@@ -0,0 +1,255 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+
+# =========================
+# ALERT LOG SETTINGS
+# =========================
+# "alert_log" section of thresholds.json. Per-frame INFO records are
+# kept at info_sample_rate (0.1 = every 10th frame); WARNING records
+# (HIGH RISK / CRITICAL) and system events are always written and
+# flushed straight away.
+DEFAULT_SETTINGS = {
+    "path": os.path.join("logs", "safety_report.jsonl"),
+    "info_sample_rate": 0.1,
+    "batch_size": 256,
+    "flush_every": 1.0,             # seconds an INFO record may wait for its batch
+    "max_bytes": 10 * 1024 * 1024,  # rotate when the file would grow past this
+    "rotate_every": 24 * 3600,      # ... or when it is older than this (seconds)
+    "backups": 5,
+    "queue_size": 10000,
+    "echo": True,                   # print written records to stdout (from the writer thread)
+}
+
+_STOP = object()
+
+
+def load_alert_log_settings(path=THRESHOLDS_FILE, camera=None):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(merged_section(load_config(path), "alert_log", camera))
+    return settings
+
+
+def console_line(record):
+    """The human-readable line app.py used to print for a record"""
+    stamp = datetime.fromtimestamp(record["ts"]).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    if "message" in record:
+        return f"{stamp} | {record['message']}"
+    if record["event"].startswith("incident_"):
+        return (f"{stamp} | INCIDENT #{record['incident']} {record['event'][9:].upper()} | {record['peak_risk']} | "
+                f"Duration={record['duration_s']:.1f}s | PeakMotion={record['peak_motion']:.2f} | "
+                f"Zones: {', '.join(record['zones']) or '-'}")
+    line = (f"{stamp} | {record['risk']} | {record['zone']} | Motion={record['motion']:.2f} | "
+            f"Spike={'YES' if record['spike'] else 'NO'} | Confidence={record['confidence']:.2f} | "
+            f"{record['action']} | Explanation: {record['explanation']}")
+    if record.get("risky_zones"):
+        line += f" | Risky Zones: {', '.join(record['risky_zones'])}"
+    return line
+
+
+# =========================
+# ASYNC JSONL WRITER
+# =========================
+def log_started_at(path):
+    """Time of the first record in an existing log (its mtime if unreadable); now for a new one"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            first = f.readline()
+    except OSError:
+        return time.time()
+    if not first.strip():
+        return time.time()
+    try:
+        return datetime.fromisoformat(json.loads(first)["ts"]).timestamp()
+    except (ValueError, KeyError, TypeError):
+        return os.path.getmtime(path)
+
+
+class AlertLog:
+    """
+    Non-blocking structured log. Callers only build a dict and put it on
+    a queue; a background thread serialises records to JSONL, writes
+    them in batches, rotates the file by size and age, and echoes them
+    to stdout.
+
+    A full queue drops sampled INFO records (counted in `dropped`) but
+    blocks for WARNING records, so alerts are never lost.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings)
+        rate = self.settings["info_sample_rate"]
+        self.sample_every = max(1, int(round(1.0 / rate))) if rate else 0
+        self.info_seen = 0
+        self.dropped = 0
+        self.written = 0
+
+        self.path = self.settings["path"]
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.file = None
+        self.opened_at = 0.0
+
+        self.queue = queue.Queue(self.settings["queue_size"])
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    # ---------- producer side ----------
+    def frame(self, level="INFO", always=None, **fields):
+        """
+        One analysed frame. INFO frames are sampled; WARNING frames are
+        always written and flushed with their batch immediately. always
+        overrides the choice for this record.
+        """
+        urgent = level != "INFO" if always is None else always
+        if not urgent:
+            self.info_seen += 1
+            if not self.sample_every or (self.info_seen - 1) % self.sample_every:
+                return False
+        fields["ts"] = time.time()
+        fields["level"] = level
+        fields["event"] = "frame"
+        return self._put(fields, urgent)
+
+    def incident(self, event, record, level="WARNING"):
+        """Incident start / escalate / end (see incidents.py); never sampled"""
+        record = dict(record, ts=time.time(), level=level, event=f"incident_{event}")
+        return self._put(record, True)
+
+    def system(self, message, level="INFO", **fields):
+        """Start / stop / reload events; never sampled"""
+        fields.update(ts=time.time(), level=level, event="system", message=message)
+        return self._put(fields, True)
+
+    def _put(self, record, urgent):
+        try:
+            if urgent:
+                self.queue.put((record, True))
+            else:
+                self.queue.put_nowait((record, False))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=5.0):
+        """Blocks until everything queued so far is on disk"""
+        done = threading.Event()
+        self.queue.put((done, True))
+        return done.wait(timeout)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put((_STOP, True))
+            self.thread.join(timeout=5.0)
+
+    # ---------- writer thread ----------
+    def _run(self):
+        pending = []
+        waiters = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item, urgent = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item, urgent = None, True
+
+            stop = item is _STOP
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None and not stop:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.settings["flush_every"]
+
+            if urgent or len(pending) >= self.settings["batch_size"]:
+                # Take whatever else is already queued into the same write
+                while not stop and len(pending) < self.settings["batch_size"]:
+                    try:
+                        item, _ = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        pending.append(item)
+                if pending:
+                    self._write(pending)
+                pending = []
+                deadline = None
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+            if stop:
+                break
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @staticmethod
+    def _serialise(record):
+        stamp = datetime.fromtimestamp(record["ts"]).isoformat(timespec="milliseconds")
+        return json.dumps({"ts": stamp, **{k: v for k, v in record.items() if k != "ts"}}, default=str)
+
+    def _write(self, records):
+        lines = [self._serialise(r) for r in records]
+        blob = "\n".join(lines) + "\n"
+        self._rotate_if_needed(len(blob))
+        self.file.write(blob)
+        self.file.flush()
+        self.written += len(records)
+        if self.settings["echo"]:
+            print("\n".join(console_line(r) for r in records))
+
+    def _rotate_if_needed(self, incoming):
+        if self.file is None:
+            # Appending to an earlier run's file keeps that file's age
+            self.opened_at = log_started_at(self.path)
+            self.file = open(self.path, "a", encoding="utf-8")
+        size = self.file.tell()
+        too_big = self.settings["max_bytes"] and size and size + incoming > self.settings["max_bytes"]
+        too_old = self.settings["rotate_every"] and size and time.time() - self.opened_at > self.settings["rotate_every"]
+        if not (too_big or too_old):
+            return
+        self.file.close()
+        backups = self.settings["backups"]
+        for i in range(backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.opened_at = time.time()
+
+
+_shared = {}
+
+
+def shared_alert_log(settings=None):
+    """One writer thread per log path and process (survives Streamlit reruns)"""
+    settings = settings or load_alert_log_settings()
+    path = os.path.abspath(settings["path"])
+    log = _shared.get(path)
+    if log is None or not log.thread.is_alive():
+        log = _shared[path] = AlertLog(**settings)
+    else:
+        # Sampling / batching follow thresholds.json edits between runs
+        log.settings.update(settings)
+        rate = settings["info_sample_rate"]
+        log.sample_every = max(1, int(round(1.0 / rate))) if rate else 0
+    return log
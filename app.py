@@ -1,11 +1,15 @@
 import streamlit as st
-import cv2
-import numpy as np
-import tempfile
+import base64
 import time
-import logging
 import os
-from datetime import datetime
+import threading
+
+from alert_log import load_alert_log_settings
+from motion_engine import load_sampling
+from service import (load_service_settings, load_ui_settings, open_source, running_sources, service_url,
+                     shared_service, subscribe)
+from uploads import UploadTooLarge, spool_cached
+from telemetry import load_telemetry_settings, shared_telemetry
 
 # =========================
 # ENVIRONMENT DETECTION
@@ -15,33 +19,10 @@ IS_CLOUD = os.environ.get("STREAMLIT_CLOUD") == "true"
 # =========================
 # LOGGING SETUP
 # =========================
-
-LOG_FILE = os.path.join("logs", "safety_report.txt")
-
-
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s"
-)
-
-def log_and_print(message, level="INFO"):
-    """Logs to file AND prints to console"""
-    if level == "WARNING":
-        logging.warning(message)
-    else:
-        logging.info(message)
-    print(message)
-
-# =========================
-# THRESHOLDS
-# =========================
-VERY_LOW = 0.60
-NORMAL = 1.20
-ELEVATED = 2.50
-HIGH = 4.00
-CRITICAL = 6.00
-SPIKE_THRESHOLD = 2.0
+# Structured JSONL written by a background thread (see alert_log.py):
+# HIGH RISK / CRITICAL frames go out immediately, calm frames are sampled.
+log_settings = load_alert_log_settings()
+LOG_FILE = log_settings["path"]
 
 # =========================
 # STREAMLIT UI
@@ -68,22 +49,40 @@ source = st.radio(
     ["Upload Video", "Use Webcam (Local Only)"]
 )
 
+sampling = load_sampling()
+stride = st.number_input(
+    "⏩ Analyse every Nth frame",
+    min_value=1, max_value=30, value=int(sampling["stride"]),
+    help="Skipped frames are not decoded; motion is normalised per frame so thresholds still apply"
+)
+
+# Page redraw rate and preview size ("ui" section of thresholds.json);
+# analysis itself always runs at full rate
+ui_settings = load_ui_settings()
+
 video_box = st.empty()
 alert_box = st.empty()
 dashboard_placeholder = st.empty()
 
 # =========================
-# VIDEO CAPTURE
+# VIDEO SOURCE
 # =========================
-cap = None
+# Analysis runs in the shared service (service.py), once per source for
+# every session watching it; this page only subscribes to its events.
+spec = None
 webcam_allowed = True
 
 if source == "Upload Video":
     uploaded_video = st.file_uploader("Upload CCTV / Crowd Video", type=["mp4", "avi"])
     if uploaded_video:
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        temp.write(uploaded_video.read())
-        cap = cv2.VideoCapture(temp.name)
+        # Streamed into the managed spool folder, deduplicated by content hash
+        try:
+            video_path, video_hash, _ = spool_cached(uploaded_video, st.session_state.setdefault("spooled", {}),
+                                                     in_use=running_sources(service_url(load_service_settings())))
+        except UploadTooLarge as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        spec = {"source": os.path.abspath(video_path), "camera": uploaded_video.name, "video_hash": video_hash}
 else:
     if IS_CLOUD:
         webcam_allowed = False
@@ -92,160 +91,115 @@ else:
 Use a video upload for demo or run locally for live camera.
 """)
     else:
-        cap = cv2.VideoCapture(0)
+        spec = {"source": 0, "camera": "webcam"}
 
 # =========================
 # START DETECTION
 # =========================
-if st.button("▶ Start Detection") and cap is not None and webcam_allowed:
-
-    ret, prev_frame = cap.read()
-    if not ret:
-        st.error("❌ Unable to read video source")
+if st.button("▶ Start Detection") and spec is not None and webcam_allowed:
+
+    # A running `python service.py` is used when it answers, otherwise
+    # one is started inside this Streamlit process
+    service_url = shared_service(load_service_settings())
+    try:
+        source_name = open_source(service_url, stride=stride, **spec)
+    except (OSError, ValueError) as e:
+        st.error(f"❌ Analysis service unavailable: {e}")
         st.stop()
 
-    log_and_print("SYSTEM STARTED | Crowd analysis running")
-
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-    prev_motion = 0.0
-
-    # Rolling average buffer to smooth sudden spikes
-    motion_buffer = []
-
-    frame_count = 0
-    spike_count = 0
-    alerts_count = 0
-    low_risk_frames = 0
-    risk_confidences = []
-    start_time = time.time()
-
-    # =========================
-    # MAIN LOOP
-    # =========================
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        flow = cv2.calcOpticalFlowFarneback(
-            prev_gray, gray, None,
-            0.5, 3, 15, 3, 5, 1.2, 0
-        )
-
-        mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-        avg_motion = float(np.mean(mag))
-
-        # ---------- Smooth motion ----------
-        motion_buffer.append(avg_motion)
-        if len(motion_buffer) > 5:
-            motion_buffer.pop(0)
-        smooth_motion = np.mean(motion_buffer)
-
-        # ---------- Spike Detection ----------
-        spike = smooth_motion - prev_motion
-        spike_detected = spike > SPIKE_THRESHOLD
-        spike_explanation = "No sudden spike." if not spike_detected else "Sudden rush detected! High risk of panic or stampede."
-
-        if spike_detected:
-            spike_count += 1
-
-        # ---------- Zone Analysis ----------
-        h, w = gray.shape
-        zones = {
-            "Zone 1 (Top-Left)": np.mean(mag[:h//2, :w//2]),
-            "Zone 2 (Top-Right)": np.mean(mag[:h//2, w//2:]),
-            "Zone 3 (Bottom-Left)": np.mean(mag[h//2:, :w//2]),
-            "Zone 4 (Bottom-Right)": np.mean(mag[h//2:, w//2:])
-        }
-        active_zone = max(zones, key=zones.get)
-
-        # ---------- Risk Classification ----------
-        if smooth_motion < VERY_LOW:
-            risk = "VERY LOW"
-            confidence = 0.95
-            explanation = "Crowd is calm, safe movement."
-        elif smooth_motion < NORMAL:
-            risk = "NORMAL"
-            confidence = 0.85
-            explanation = "Crowd is moving normally."
-        elif smooth_motion < ELEVATED:
-            risk = "ELEVATED"
-            confidence = 0.70
-            explanation = "Crowd is getting dense, monitor carefully."
-        elif smooth_motion < HIGH:
-            risk = "HIGH RISK"
-            confidence = 0.60
-            explanation = "Crowd is moving fast, prepare staff."
-        else:
-            risk = "CRITICAL"
-            confidence = 0.90
-            explanation = "Crowd movement is dangerous, act immediately!"
-
-        if spike_detected:
-            risk = "CRITICAL"
-            confidence = 0.99
-            explanation = "Sudden rush detected! High risk of panic or stampede."
-
-        risk_confidences.append(confidence)
-
-        # ---------- Action ----------
-        if risk == "CRITICAL":
-            action = "IMMEDIATE ACTION: Open exits, stop inflow, alert authorities"
-        elif risk == "HIGH RISK":
-            action = "PREVENTIVE ACTION: Control entry, deploy staff"
-        elif risk == "ELEVATED":
-            action = "MONITOR: Crowd density rising"
-        else:
-            action = "SAFE"
-
-        # ---------- Logging ----------
-        log_message = (
-            f"{datetime.now()} | {risk} | {active_zone} | "
-            f"Motion={smooth_motion:.2f} | Spike={'YES' if spike_detected else 'NO'} | "
-            f"Confidence={confidence:.2f} | {action} | Explanation: {explanation} | Spike Info: {spike_explanation}"
-        )
-        if risk in ["HIGH RISK", "CRITICAL"]:
-            alerts_count += 1
-            log_and_print(log_message, "WARNING")
-            alert_box.warning(log_message)
-        else:
-            low_risk_frames += 1
-            log_and_print(log_message, "INFO")
-
-        # ---------- Overlay ----------
-        cv2.putText(frame, f"Risk: {risk} ({confidence:.2f})", (20, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-        cv2.putText(frame, f"Active Zone: {active_zone}", (20, 80),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, f"Spike: {'YES' if spike_detected else 'NO'}", (20, 120),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-
-        video_box.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    telemetry = shared_telemetry(load_telemetry_settings(camera=spec["camera"]))
+
+    # Filled from the service's events by a subscriber thread; the page
+    # redraws from it at ui.fps (see render_snapshot)
+    state = {
+        "frames": 0, "spikes": 0, "alerts": 0, "incidents": 0, "low_risk": 0,
+        "confidence_total": 0.0, "latency_total": 0.0, "latency_max": 0.0,
+        "smooth_motion": 0.0, "density": 0.0, "risk": "", "confidence": 0.0, "spike": False, "active_zone": "",
+        "jpeg": None, "frame_seq": 0, "alert": None, "alert_seq": 0,
+        "elapsed": 0.0, "fps": 0.0, "dropped_frames": 0, "ended": False, "error": None,
+    }
+    state_lock = threading.Lock()
+    stop_following = threading.Event()
+
+    def follow():
+        try:
+            for event, data in subscribe(service_url, source_name, stop_following):
+                with state_lock:
+                    if event == "frame":
+                        state.update((k, data[k]) for k in data if k in state)
+                    elif event == "preview":
+                        state["jpeg"] = base64.b64decode(data["jpeg"])
+                        state["frame_seq"] += 1
+                    elif event == "incident":
+                        state["alert"] = (data["kind"], data["message"])
+                        state["alert_seq"] += 1
+                    elif event == "end":
+                        state.update((k, data[k]) for k in data if k in state)
+                        state["ended"] = True
+        except (OSError, ValueError) as e:
+            with state_lock:
+                state["error"] = f"Lost connection to the analysis service: {e}"
+
+    rendered = {"frame_seq": 0, "alert_seq": 0}
+
+    def render_snapshot():
+        """Redraws preview, alert and dashboard from the latest service state"""
+        with state_lock:
+            snap = dict(state)
+        render_start = time.perf_counter()
+
+        # ---------- Preview (JPEG drawn by the service, only when a new one arrived) ----------
+        if snap["jpeg"] is not None and snap["frame_seq"] != rendered["frame_seq"]:
+            video_box.image(snap["jpeg"])
+            rendered["frame_seq"] = snap["frame_seq"]
+
+        # ---------- Alert ----------
+        if snap["alert"] is not None and snap["alert_seq"] != rendered["alert_seq"]:
+            kind, message = snap["alert"]
+            (alert_box.info if kind == "info" else alert_box.warning)(message)
+            rendered["alert_seq"] = snap["alert_seq"]
 
         # ---------- Dashboard ----------
+        frames = snap["frames"]
         with dashboard_placeholder.container():
-            c1, c2, c3, c4, c5, c6 = st.columns(6)
-            c1.metric("Frames", frame_count, help="Number of frames processed")
-            c2.metric("Motion", f"{smooth_motion:.2f}", help="Average crowd movement magnitude")
-            c3.metric("Spikes", spike_count, help="Number of sudden crowd rushes detected")
-            c4.metric("Alerts", alerts_count, help="High/critical risk frames logged")
-            c5.metric("Confidence", f"{np.mean(risk_confidences):.2f}", help="System confidence in detected risk")
-            c6.metric("Active Zone", active_zone, help="Zone with most crowd activity currently")
-
-        prev_gray = gray
-        prev_motion = smooth_motion
-        frame_count += 1
-
-    cap.release()
-    fps = frame_count / (time.time() - start_time)
-    avg_confidence = np.mean(risk_confidences) if risk_confidences else 0.0
-
-    log_and_print(
-        f"SYSTEM STOPPED | Frames={frame_count} | Alerts={alerts_count} | "
-        f"LowRiskFrames={low_risk_frames} | AvgConfidence={avg_confidence:.2f} | FPS={fps:.2f}"
-    )
+            c1, c2, c3, c4, c5, c6, c7 = st.columns(7)
+            c1.metric("Frames", frames, help="Number of frames processed")
+            c2.metric("Motion", f"{snap['smooth_motion']:.2f}", help="Average crowd movement magnitude")
+            c3.metric("Spikes", snap["spikes"], help="Number of sudden crowd rushes detected")
+            c4.metric("Incidents", snap["incidents"], help="Debounced high/critical episodes (see thresholds.json \"incidents\")")
+            c5.metric("Confidence", f"{snap['confidence_total'] / max(frames, 1):.2f}", help="System confidence in detected risk")
+            c6.metric("Active Zone", snap["active_zone"], help="Zone with most crowd activity currently")
+            c7.metric("Density", f"{snap['density']:.0%}", help="Share of the frame covered by people (background subtraction)")
+        if telemetry:
+            telemetry.observe("render_seconds", time.perf_counter() - render_start)
+
+    follower = threading.Thread(target=follow, daemon=True)
+    follower.start()
+    try:
+        while follower.is_alive():
+            render_snapshot()
+            follower.join(1.0 / max(0.1, float(ui_settings["fps"])))
+    finally:
+        # Streamlit stops a script by raising in it; leaving only ends this
+        # subscription, the service keeps analysing for other viewers
+        stop_following.set()
+        follower.join()
+    render_snapshot()
+
+    if state["error"]:
+        st.error(f"❌ {state['error']}")
+        st.stop()
+
+    frame_count = state["frames"]
+    alerts_count = state["alerts"]
+    incident_count = state["incidents"]
+    spike_count = state["spikes"]
+    low_risk_frames = state["low_risk"]
+    fps = state["fps"]
+    avg_confidence = state["confidence_total"] / frame_count if frame_count else 0.0
+    avg_latency = state["latency_total"] / frame_count if frame_count else 0.0
+    latency_max = state["latency_max"]
+    dropped_frames = state["dropped_frames"]
 
     # =========================
     # FINAL BEGINNER-FRIENDLY SUMMARY
@@ -266,7 +220,8 @@ The system watched **crowd movement over time** and detected:
 - **CRITICAL:** Dangerous crowd, immediate action required  
 
 ### 🚨 Alerts Summary
-• Total Alerts (High / Critical): **{alerts_count}**  
+• Incidents (debounced High / Critical episodes): **{incident_count}**  
+• Total Alert Frames (High / Critical): **{alerts_count}**  
 • Sudden Movements / Spikes: **{spike_count}**  
 • Calm / Low-Risk Frames: **{low_risk_frames}**  
 • Average Confidence: **{avg_confidence:.2f}**  
@@ -279,11 +234,14 @@ The system watched **crowd movement over time** and detected:
 
 ### 📁 Logs
 • File: **{LOG_FILE}**  
-• Contains timestamp, risk, active zone, motion, spike, confidence, action, explanation  
+• One JSON record per line: timestamp, risk, active zone, motion, spike, confidence, action, explanation  
+• Every HIGH RISK / CRITICAL frame is logged; calm frames are sampled  
 • Can be used for audit or review
 
 ### ⚙️ System Health
-• Processing speed: **{fps:.2f} FPS**  
+• Processing speed (analysis, excluding dashboard rendering): **{fps:.2f} FPS**  
+• Dropped frames (live feed only): **{dropped_frames}**  
+• Alert latency (capture → risk decision): **{avg_latency * 1000:.0f} ms avg / {latency_max * 1000:.0f} ms max**  
 • Dashboard is visual only; **trust logs first**
 """)
 
@@ -297,6 +255,6 @@ if os.path.exists(LOG_FILE):
     with open(LOG_FILE, "r", errors="replace") as f:
         log_text = f.read()
     st.text_area("Log Output (Read-Only)", log_text, height=250)
-    st.download_button("⬇️ Download Logs", log_text, file_name="safety_reports.txt")
+    st.download_button("⬇️ Download Logs", log_text, file_name=os.path.basename(LOG_FILE))
 else:
     st.info("No logs generated yet.")
\ No newline at end of file
@@ -0,0 +1,216 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from capture import load_capture_settings, open_capture
+from config import load_config
+from detection import find_videos
+from incidents import IncidentTracker, load_incident_settings
+from motion_engine import MotionEngine, frame_stride, iter_metrics, load_engine_settings, load_sampling
+from risk import LEVELS, apply_density, apply_trend, classify_level, load_thresholds
+from trends import MotionTrends, load_trend_windows
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# =========================
+# HEADLESS BATCH ANALYSIS
+# =========================
+# Runs archived footage through the same engine, smoothing, spike /
+# trend rules and incidents as app.py, with no rendering, and writes
+# per video:
+#   <name>.timeline.parquet (or .csv)   one row per analysed frame
+#   <name>.summary.json                 what the app's final report shows
+# where <name> is the video's path below the inputs' common folder, so
+# cam1/2024-01-01.mp4 and cam2/2024-01-01.mp4 keep separate outputs
+# (the extension stays on where only it tells two videos apart).
+#
+#   python batch.py data/ --out results/ --workers 4
+#
+# The exit status is the worst verdict across all videos.
+EXIT_CODES = {"SAFE": 0, "MONITOR": 1, "DANGEROUS": 2, "ERROR": 3}
+
+DEFAULT_VERDICTS = {
+    "SAFE": ["VERY LOW", "NORMAL"],
+    "MONITOR": ["ELEVATED"],
+    "DANGEROUS": ["HIGH RISK", "CRITICAL"],
+}
+
+
+def verdict_for(label, config=None):
+    """Maps a risk label to SAFE / MONITOR / DANGEROUS via verdict_mapping"""
+    mapping = (config or {}).get("verdict_mapping", DEFAULT_VERDICTS)
+    for verdict, labels in mapping.items():
+        if label in labels:
+            return verdict
+    return "DANGEROUS"
+
+
+# =========================
+# ONE VIDEO (WORKER)
+# =========================
+def analyse_video(video_path):
+    """
+    Returns (timeline columns, summary). Columns are plain lists / numpy
+    arrays keyed by name so the parent can write them in any format.
+    """
+    name = os.path.basename(video_path)
+    engine_settings = load_engine_settings(camera=name)
+    cap = open_capture(video_path, load_capture_settings(camera=name), engine_settings["process_width"])
+    ret, first = cap.read() if cap.isOpened() else (False, None)
+    if not ret:
+        cap.release()
+        return None, {"video": video_path, "verdict": "ERROR", "error": "Unable to read video source"}
+
+    config = load_config()
+    sampling = load_sampling(camera=name)
+    engine = MotionEngine(**engine_settings)
+    engine.process(first)
+    thresholds = load_thresholds(camera=name)
+    labels = thresholds["labels"]
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    stride = frame_stride(cap, sampling["stride"], sampling["target_fps"])
+    trends = MotionTrends(load_trend_windows(camera=name), source_fps / stride)
+    incidents = IncidentTracker(name, **load_incident_settings(camera=name))
+
+    columns = {k: [] for k in ("frame", "time_s", "motion", "smooth_motion", "density", "spike", "trend", "risk", "active_zone")}
+    zone_columns = {}
+    counter = Counter()
+    spikes = 0
+    prev_motion = 0.0
+    start = time.time()
+
+    for _, metrics in iter_metrics(cap, engine, stride, sampling["target_fps"]):
+        trends.push(metrics.avg_motion, metrics.frame_number / source_fps)
+        smooth = trends.mean("smooth")
+        slope = trends.slope_per_second("trend")
+        level, spike_detected = classify_level(smooth, smooth - prev_motion, thresholds)
+        level, _ = apply_trend(level, slope, thresholds)
+        level, _ = apply_density(level, metrics.density, thresholds)
+        prev_motion = smooth
+        counter[level] += 1
+        spikes += int(spike_detected)
+        incidents.update(level, smooth, metrics.frame_number / source_fps, metrics.frame_number)
+
+        columns["frame"].append(metrics.frame_number)
+        columns["time_s"].append(metrics.frame_number / source_fps)
+        columns["motion"].append(metrics.avg_motion)
+        columns["smooth_motion"].append(smooth)
+        columns["density"].append(metrics.density)
+        columns["spike"].append(bool(spike_detected))
+        columns["trend"].append(slope)
+        columns["risk"].append(labels[level])
+        columns["active_zone"].append(metrics.active_zone)
+        for zone, value in metrics.zones.items():
+            zone_columns.setdefault(zone, []).append(value)
+
+    cap.release()
+    incidents.close()
+    elapsed = time.time() - start
+    frames = sum(counter.values())
+
+    for key in ("motion", "smooth_motion", "density", "trend", "time_s"):
+        columns[key] = np.asarray(columns[key], dtype=np.float32)
+    columns["frame"] = np.asarray(columns["frame"], dtype=np.int32)
+    for zone, values in zone_columns.items():
+        columns[f"zone:{zone}"] = np.asarray(values, dtype=np.float32)
+
+    dominant = labels[max(counter, key=counter.get)] if frames else labels["very_low"]
+    summary = {
+        "video": video_path,
+        "frames": frames,
+        "duration_s": round(float(columns["time_s"][-1]) if frames else 0.0, 2),
+        "processing_fps": round(frames / elapsed, 2) if elapsed > 0 else None,
+        "avg_motion": round(float(np.mean(columns["motion"])), 4) if frames else 0.0,
+        "dominant_risk": dominant,
+        "distribution": {labels[level]: counter[level] for level in LEVELS},
+        "spikes": spikes,
+        "incidents": incidents.count,
+        "verdict": verdict_for(dominant, config),
+    }
+    return columns, summary
+
+
+# =========================
+# OUTPUT
+# =========================
+def write_timeline(columns, path_stem, fmt="auto"):
+    """parquet when pandas + pyarrow are installed (fmt auto/parquet), else CSV"""
+    if fmt in ("auto", "parquet") and pd is not None:
+        try:
+            path = path_stem + ".timeline.parquet"
+            pd.DataFrame(columns).to_parquet(path, index=False)
+            return path
+        except ImportError:
+            if fmt == "parquet":
+                raise
+    path = path_stem + ".timeline.csv"
+    names = list(columns)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*(columns[n] for n in names)))
+    return path
+
+
+def output_stems(video_paths, out_dir="results"):
+    """Output path (without suffix) per video, unique across the batch"""
+    paths = [os.path.abspath(p) for p in video_paths]
+    try:
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    except ValueError:      # different drives
+        root = None
+    names = [os.path.relpath(p, root) if root else os.path.splitdrive(p)[1].lstrip("\\/") for p in paths]
+    bare = [os.path.splitext(n)[0] for n in names]
+    counts = Counter(os.path.normcase(b) for b in bare)
+    return [os.path.join(out_dir, b if counts[os.path.normcase(b)] == 1 else n) for b, n in zip(bare, names)]
+
+
+def run_batch(video_paths, out_dir="results", workers=None, fmt="auto"):
+    """Analyses every video on a process pool; returns the list of summaries"""
+    os.makedirs(out_dir, exist_ok=True)
+    summaries = []
+    stems = output_stems(video_paths, out_dir)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for video_path, stem, (columns, summary) in zip(video_paths, stems, pool.map(analyse_video, video_paths)):
+            os.makedirs(os.path.dirname(stem), exist_ok=True)
+            if columns is not None:
+                summary["timeline"] = write_timeline(columns, stem, fmt)
+            with open(stem + ".summary.json", "w") as f:
+                json.dump(summary, f, indent=2)
+            summaries.append(summary)
+
+            if summary["verdict"] == "ERROR":
+                print(f"❌ {video_path} | {summary['error']}", file=sys.stderr)
+            else:
+                print(f"🎥 {os.path.relpath(stem, out_dir)} | {summary['frames']} frames @ {summary['processing_fps']} FPS | "
+                      f"Dominant: {summary['dominant_risk']} | Incidents: {summary['incidents']} | "
+                      f"Verdict: {summary['verdict']}")
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless crowd risk analysis of archived footage")
+    parser.add_argument("videos", nargs="+", help="Video files, directories or globs")
+    parser.add_argument("--out", default="results", help="Folder for timelines and summaries")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU cores)")
+    parser.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto", help="Timeline format")
+    args = parser.parse_args()
+
+    paths = find_videos(args.videos)
+    if not paths:
+        print("❌ No videos found", file=sys.stderr)
+        sys.exit(EXIT_CODES["ERROR"])
+
+    summaries = run_batch(paths, args.out, args.workers, args.format)
+    sys.exit(max(EXIT_CODES[s["verdict"]] for s in summaries))
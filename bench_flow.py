@@ -0,0 +1,128 @@
+import argparse
+import json
+import multiprocessing
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmark import peak_rss_mb
+from flow_backends import FARNEBACK_PARAMS, FarnebackBackend
+
+# =========================
+# MICRO-BENCHMARK: FLOW HOT LOOP
+# =========================
+# Compares the loop every entry point used to run (flow=None, flags=0,
+# cartToPolar allocating magnitude AND angle) with FarnebackBackend
+# (preallocated buffers, previous flow as initial estimate, magnitude
+# only), on synthetic textured frames drifting a couple of pixels per
+# frame. Reports ms per frame, bytes allocated per frame and peak RSS
+# growth.
+#
+# tracemalloc only sees Python / numpy allocations, not the cv::Mat
+# buffers OpenCV allocates inside calcOpticalFlowFarneback, so a 0 there
+# means no Python-side allocation, not none at all. Peak RSS growth over
+# the loop (each variant in a fresh process) covers native buffers too.
+#
+#   python bench_flow.py --frames 30
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def synthetic_frames(width, height, count, seed=0):
+    """Smoothed noise texture panned 2 px right / 1 px down per frame"""
+    rng = np.random.default_rng(seed)
+    texture = rng.integers(0, 256, (height + count, width + 2 * count), dtype=np.uint8)
+    texture = cv2.GaussianBlur(texture, (0, 0), 3)
+    return [np.ascontiguousarray(texture[i:i + height, 2 * i:2 * i + width]) for i in range(count)]
+
+
+def legacy_step(prev_gray, gray):
+    p = FARNEBACK_PARAMS
+    flow = cv2.calcOpticalFlowFarneback(
+        prev_gray, gray, None,
+        p["pyr_scale"], p["levels"], p["winsize"],
+        p["iterations"], p["poly_n"], p["poly_sigma"], 0
+    )
+    mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+    return float(np.mean(mag))
+
+
+def engine_step(backend):
+    def step(prev_gray, gray):
+        mag, _ = backend.compute(prev_gray, gray)
+        return float(np.mean(mag))
+    return step
+
+
+def measure(step, frames):
+    """
+    (ms per frame, Python-side bytes allocated per frame, mean motion,
+    peak RSS growth in MB) after one warm-up pair
+    """
+    rss_before = peak_rss_mb()
+    step(frames[0], frames[1])
+    elapsed = 0.0
+    allocated = 0
+    motions = []
+    tracemalloc.start()
+    for prev_gray, gray in zip(frames[1:], frames[2:]):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        motions.append(step(prev_gray, gray))
+        elapsed += time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    tracemalloc.stop()
+    pairs = len(frames) - 2
+    rss_after = peak_rss_mb()
+    rss_growth = None if rss_before is None else round(rss_after - rss_before, 1)
+    return elapsed / pairs * 1000, allocated / pairs, float(np.mean(motions)), rss_growth
+
+
+VARIANTS = ["before", "after", "after_warm"]
+
+
+def measure_variant(label, name, frames_per_resolution, warm):
+    """One variant on one resolution (run in its own process for a clean peak RSS)"""
+    width, height = RESOLUTIONS[label]
+    frames = synthetic_frames(width, height, frames_per_resolution)
+    if name == "before":
+        step = legacy_step
+    else:
+        step = engine_step(FarnebackBackend(warm if name == "after_warm" else None))
+    return measure(step, frames)
+
+
+def run(frames_per_resolution=30, warm_levels=None, warm_iterations=None):
+    results = {}
+    warm = {"warm_levels": warm_levels, "warm_iterations": warm_iterations}
+    context = multiprocessing.get_context("spawn")
+    for label in RESOLUTIONS:
+        results[label] = {}
+        for name in VARIANTS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                ms, alloc, motion, rss = pool.submit(measure_variant, label, name, frames_per_resolution, warm).result()
+            results[label][name] = {"ms_per_frame": round(ms, 2),
+                                    "python_bytes_allocated_per_frame": int(alloc),
+                                    "peak_rss_growth_mb": rss,
+                                    "mean_motion": round(motion, 3)}
+            print(f"{label:<6} {name:<11} {ms:8.2f} ms/frame  {alloc / 1e6:8.2f} MB/frame (Python)  "
+                  f"peak RSS +{rss} MB  motion={motion:.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flow hot-loop micro-benchmark")
+    parser.add_argument("--frames", type=int, default=30, help="Synthetic frames per resolution")
+    parser.add_argument("--warm-levels", type=int, default=2, help="Pyramid levels once warm (after_warm)")
+    parser.add_argument("--warm-iterations", type=int, default=2, help="Iterations once warm (after_warm)")
+    parser.add_argument("--json", default=None, help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.frames, args.warm_levels, args.warm_iterations)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,333 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from alert_log import AlertLog, load_alert_log_settings
+from capture import load_capture_settings, open_capture
+from flow_backends import BACKENDS
+from incidents import IncidentTracker, load_incident_settings
+from motion_engine import MotionEngine, iter_metrics, load_engine_settings
+from risk import LiveThresholds, apply_density, apply_trend, classify_level, classify_zones, level_for_label
+from service import ACTIONS, ALERT_LEVELS
+from stats import StreamingStats
+from telemetry import Telemetry
+from trends import MotionTrends, load_trend_windows
+from synthetic import RESOLUTIONS, SCENARIOS, ensure_video
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+# =========================
+# BENCHMARK SUITE
+# =========================
+# Runs each entry point's per-frame work on synthetic crowd clips through
+# the real capture, MotionEngine and telemetry laps, and reports
+# frames/sec, mean latency per stage and peak RSS, as JSON that can be
+# diffed across releases. Offline and CPU only.
+#
+#   python benchmark.py --resolutions 360p,720p --backends farneback,dis_fast --out bench.json
+#
+# Every case runs in a fresh process so peak RSS belongs to that case.
+STAGES = ["decode", "gray", "gate", "density", "flow", "magnitude", "zones", "classification", "logging"]
+
+# What each entry point does per frame on top of the shared engine, with
+# the same helpers the entry points call:
+#   app        service.py loop: trends + level/trend/density + zone risks,
+#              incidents, sampled AlertLog frame records
+#   detection  calibration chunk: gate scores + StreamingStats, no risk
+#   runner     trends + level/trend/density, incidents, one JSON line per frame
+#   main       640x480 resize first, level + incidents, a log line per incident
+ENTRY_POINTS = ["app", "detection", "runner", "main"]
+MAIN_SIZE = (640, 480)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1e6, 1)
+    except ImportError:
+        return None
+
+
+class ResizedCapture:
+    """main.py's cv2.VideoCapture + 640x480 resize behind the capture interface"""
+
+    def __init__(self, source, size=MAIN_SIZE):
+        self.cap = cv2.VideoCapture(source)
+        self.size = size
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return ret, cv2.resize(frame, self.size) if ret else frame
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+def stage_ms(snapshot, frames):
+    """Mean ms per analysed frame for every stage_seconds{stage=...} histogram"""
+    per_frame = max(frames, 1)
+    stages = {}
+    for (name, labels), hist in snapshot["histograms"].items():
+        if name == "stage_seconds":
+            stages[dict(labels)["stage"]] = round(hist[-1] / per_frame * 1000, 3)
+    return {s: stages.get(s, 0.0) for s in STAGES}
+
+
+# =========================
+# ONE CASE
+# =========================
+def entry_step(entry, thresholds, source_fps, scratch):
+    """
+    The entry point's per-frame work after MotionEngine.process, as
+    step(metrics, telemetry); returns (step, close).
+    """
+    current = thresholds.get()
+    incidents = IncidentTracker("benchmark", **load_incident_settings())
+
+    if entry == "detection":
+        stats = StreamingStats()
+        changes = StreamingStats()
+
+        def step(metrics, telemetry):
+            stats.add(metrics.avg_motion)
+            if metrics.change_score is not None:
+                changes.add(metrics.change_score)
+            telemetry.lap("classification")
+        return step, lambda: None
+
+    if entry == "main":
+        log_file = open(os.path.join(scratch, "safety_report.txt"), "a")
+
+        def step(metrics, telemetry):
+            level, _ = classify_level(metrics.avg_motion, 0.0, current)
+            events = incidents.update(level, metrics.avg_motion, metrics.frame_number / source_fps,
+                                      metrics.frame_number)
+            telemetry.lap("classification")
+            for event, incident in events:
+                log_file.write(f"[{time.strftime('%H:%M:%S')}] RISK: {level} | Score: {incident.peak_motion:.2f} | "
+                               f"INCIDENT #{incident.id} {event.upper()} | Duration={incident.duration:.1f}s\n")
+            telemetry.lap("logging")
+        return step, log_file.close
+
+    trends = MotionTrends(load_trend_windows(), source_fps)
+    state = {"prev_motion": 0.0}
+
+    if entry == "runner":
+        out_file = open(os.path.join(scratch, "out.jsonl"), "w")
+
+        def step(metrics, telemetry):
+            trends.push(metrics.avg_motion, metrics.frame_number / source_fps)
+            smooth_motion = trends.mean("smooth")
+            slope = trends.slope_per_second("trend")
+            level, spike_detected = classify_level(smooth_motion, smooth_motion - state["prev_motion"], current)
+            level, trend_detected = apply_trend(level, slope, current)
+            level, dense = apply_density(level, metrics.density, current)
+            state["prev_motion"] = smooth_motion
+            events = incidents.update(level, smooth_motion, metrics.frame_number / source_fps,
+                                      metrics.frame_number, [metrics.active_zone], spike_detected)
+            telemetry.lap("classification")
+            out_file.write(json.dumps({
+                "type": "frame", "source": "benchmark", "frame": metrics.frame_number, "time": time.time(),
+                "motion": round(smooth_motion, 4), "spike": spike_detected, "trend": round(slope, 4),
+                "rising": trend_detected, "density": round(metrics.density, 4), "dense": dense,
+                "zone": metrics.active_zone, "risk": current["labels"][level],
+            }) + "\n")
+            for event, incident in events:
+                out_file.write(json.dumps({"type": "incident", "event": event, "source": "benchmark",
+                                           **incident.to_dict(current["labels"])}) + "\n")
+            telemetry.lap("logging")
+        return step, out_file.close
+
+    settings = dict(load_alert_log_settings(), path=os.path.join(scratch, "safety_report.jsonl"), echo=False)
+    alert_log = AlertLog(**settings)
+
+    def step(metrics, telemetry):
+        trends.push(metrics.avg_motion, metrics.frame_number / source_fps)
+        smooth_motion = trends.mean("smooth")
+        slope = trends.slope_per_second("trend")
+        spike = smooth_motion - state["prev_motion"]
+        state["prev_motion"] = smooth_motion
+        level, spike_detected = classify_level(smooth_motion, spike, current)
+        level, trend_detected = apply_trend(level, slope, current)
+        level, dense = apply_density(level, metrics.density, current)
+        zone_risks = classify_zones(metrics, thresholds)
+        risky_zones = [z for z, r in zone_risks.items() if level_for_label(r, current) in ALERT_LEVELS]
+        risk = current["labels"][level]
+        action = ACTIONS.get(level, "SAFE")
+        events = incidents.update(level, float(smooth_motion), metrics.frame_number / source_fps,
+                                  metrics.frame_number, risky_zones, spike_detected)
+        telemetry.lap("classification")
+        for event, incident in events:
+            alert_log.incident(event, incident.to_dict(current["labels"]))
+        alert_log.frame(
+            "WARNING" if level in ALERT_LEVELS else "INFO",
+            camera="benchmark", frame=metrics.frame_number, risk=risk, zone=metrics.active_zone,
+            motion=round(float(smooth_motion), 4), spike=bool(spike_detected), action=action,
+            risky_zones=risky_zones, trend=round(float(slope), 4),
+            baseline=round(float(trends.mean("baseline")), 4), density=round(float(metrics.density), 4),
+        )
+        telemetry.lap("logging")
+
+    def close():
+        alert_log.flush()
+        alert_log.close()
+    return step, close
+
+
+def run_case(case):
+    """
+    case: {video, entry_point, backend, max_frames, gate_floor, roi}.
+    gate_floor / roi (None: as thresholds.json has them) switch on the
+    motion gate and region of interest for every entry point. Drives
+    iter_metrics
+    over the entry point's capture and a MotionEngine with its own
+    Telemetry registry, so the per-stage costs are the engine's own lap
+    timers; the entry point's risk and logging work is charged to the
+    "classification" and "logging" laps.
+    """
+    entry = case["entry_point"]
+    settings = load_engine_settings()
+    settings["backend"] = case["backend"]
+    if case.get("gate_floor") is not None:
+        settings["gate"] = dict(settings["gate"], enabled=True, floor=case["gate_floor"])
+    if case.get("roi"):
+        settings["roi"] = case["roi"]
+    if entry == "detection":
+        # As in detection.py: the gate only measures, density is off
+        settings["gate"] = dict(settings["gate"], enabled=True, floor=0.0)
+        settings["density"] = {"enabled": False}
+    telemetry = Telemetry()
+    engine = MotionEngine(**settings, telemetry=telemetry)
+    if entry == "main":
+        cap = ResizedCapture(case["video"])
+    else:
+        cap = open_capture(case["video"], load_capture_settings(), settings["process_width"])
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    scratch = tempfile.mkdtemp(prefix="bench_")
+    step, close = entry_step(entry, LiveThresholds(), source_fps, scratch)
+
+    latencies = []
+    motions = []
+    frames = 0
+    start = time.perf_counter()
+    mark = start
+    for _, metrics in iter_metrics(cap, engine):
+        step(metrics, telemetry)
+        motions.append(metrics.avg_motion)
+        frames += 1
+        now = time.perf_counter()
+        latencies.append(now - mark)
+        mark = now
+        if frames >= case["max_frames"]:
+            break
+    close()
+    elapsed = time.perf_counter() - start
+
+    cap.release()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    latency_ms = np.array(latencies or [0.0]) * 1000
+    return {
+        **{k: case[k] for k in ("scenario", "resolution", "entry_point", "backend")},
+        "frames": frames,
+        "fps": round(frames / elapsed, 2) if elapsed > 0 else None,
+        "stage_ms": stage_ms(telemetry.snapshot(), frames),
+        "frame_ms_p50": round(float(np.percentile(latency_ms, 50)), 3),
+        "frame_ms_p95": round(float(np.percentile(latency_ms, 95)), 3),
+        "mean_motion": round(float(np.mean(motions)), 3) if motions else None,
+        "max_motion": round(float(np.max(motions)), 3) if motions else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(case):
+    """run_case in a fresh process so peak RSS is not shared between cases"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, case).result()
+
+
+# =========================
+# SUITE
+# =========================
+def run_suite(scenarios, resolutions, backends, entry_points, frames=120,
+              video_folder="bench_videos", isolate=True, gate_floor=None, roi=None):
+    results = []
+    for scenario in scenarios:
+        for resolution in resolutions:
+            video = ensure_video(video_folder, scenario, resolution, frames)
+            for entry in entry_points:
+                for backend in backends:
+                    case = {"video": video, "scenario": scenario, "resolution": resolution,
+                            "entry_point": entry, "backend": backend, "max_frames": frames,
+                            "gate_floor": gate_floor, "roi": roi}
+                    result = run_isolated(case) if isolate else run_case(case)
+                    results.append(result)
+                    stages = " ".join(f"{s}={result['stage_ms'][s]:.2f}" for s in STAGES)
+                    print(f"{scenario:<6} {resolution:<6} {entry:<10} {backend:<14} "
+                          f"{result['fps']:8.1f} fps  rss={result['peak_rss_mb']} MB  [{stages}] ms")
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "frames_per_case": frames,
+        "gate_floor": gate_floor,
+        "roi": roi,
+        "stages": STAGES,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput / latency / memory benchmark on synthetic crowds")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from {list(SCENARIOS)}")
+    parser.add_argument("--resolutions", default="360p,720p", help=f"Comma-separated, from {list(RESOLUTIONS)}")
+    parser.add_argument("--backends", default="farneback,dis_fast", help=f"Comma-separated, from {BACKENDS}")
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS), help=f"Comma-separated, from {ENTRY_POINTS}")
+    parser.add_argument("--frames", type=int, default=120, help="Frames per synthetic clip")
+    parser.add_argument("--videos", default="bench_videos", help="Where generated clips are cached")
+    parser.add_argument("--gate-floor", type=float, default=None,
+                        help="Enable the motion gate with this floor for every case (default: as configured)")
+    parser.add_argument("--roi", default=None,
+                        help="x0,y0,x1,y1 rectangle in 0..1 frame fractions to analyse (default: as configured)")
+    parser.add_argument("--no-isolate", action="store_true", help="Run cases in this process (RSS becomes cumulative)")
+    parser.add_argument("--out", default=None, help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    roi = None
+    if args.roi:
+        x0, y0, x1, y1 = (float(v) for v in args.roi.split(","))
+        roi = [[[x0, y0], [x1, y0], [x1, y1], [x0, y1]]]
+
+    report = run_suite(args.scenarios.split(","), args.resolutions.split(","),
+                       args.backends.split(","), args.entry_points.split(","),
+                       args.frames, args.videos, not args.no_isolate, args.gate_floor, roi)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
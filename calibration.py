@@ -1,17 +1,24 @@
 import streamlit as st
 import cv2
 import numpy as np
-import tempfile
 import time
 
+from motion_engine import MotionEngine, load_engine_settings, load_sampling
+from result_cache import iter_cached_metrics
+from risk import LEVELS, LiveThresholds, classify_level
+from uploads import UploadTooLarge, spool_cached
+
 # =========================
 # FINAL THRESHOLDS (FROM CALIBRATION)
 # =========================
-VERY_LOW   = 0.60
-NORMAL     = 1.20
-ELEVATED   = 2.50
-HIGH       = 4.00
-CRITICAL   = 6.00
+# Read from thresholds.json and hot-reloaded while the video runs.
+LEVEL_STYLE = {
+    "very_low": ((200, 200, 200), "Minimal movement"),
+    "normal": ((0, 255, 0), "Stable crowd flow"),
+    "elevated": ((0, 255, 255), "Increased activity"),
+    "high": ((0, 165, 255), "Abnormal acceleration"),
+    "critical": ((0, 0, 255), "Possible panic or stampede"),
+}
 
 # =========================
 # STREAMLIT UI SETUP
@@ -35,6 +42,8 @@ result_box = st.empty()   # 🔹 FINAL RESULT BOX
 # INPUT SOURCE
 # =========================
 cap = None
+camera_id = None
+video_hash = None
 
 if source == "Upload Video":
     uploaded_video = st.file_uploader(
@@ -42,11 +51,16 @@ if source == "Upload Video":
         type=["mp4", "avi", "mov"]
     )
     if uploaded_video:
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        temp.write(uploaded_video.read())
-        cap = cv2.VideoCapture(temp.name)
+        try:
+            video_path, video_hash, _ = spool_cached(uploaded_video, st.session_state.setdefault("spooled", {}))
+        except UploadTooLarge as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        cap = cv2.VideoCapture(video_path)
+        camera_id = uploaded_video.name
 else:
     cap = cv2.VideoCapture(0)
+    camera_id = "webcam"
 
 # =========================
 # START BUTTON
@@ -58,39 +72,27 @@ if st.button("▶ Start Detection") and cap is not None:
         st.error("Unable to read video")
         st.stop()
 
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
+    engine_settings = load_engine_settings(camera=camera_id)
+    engine = MotionEngine(**engine_settings)
+    engine.process(prev_frame)
+    thresholds = LiveThresholds(camera_id)
 
     prev_motion = 0
     alerts = []
 
     # 🔹 FINAL RESULT STORAGE
     motion_history = []
-    risk_counter = {
-        "VERY LOW": 0,
-        "NORMAL": 0,
-        "ELEVATED": 0,
-        "HIGH RISK": 0,
-        "CRITICAL": 0
-    }
+    risk_counter = {level: 0 for level in LEVELS}
 
     start_time = time.time()
     frame_count = 0
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
+    # Re-runs of the same video replay cached metrics, so tuning
+    # thresholds.json does not re-run optical flow (see result_cache.py)
+    for frame, metrics in iter_cached_metrics(cap, engine, **load_sampling(camera=camera_id),
+                                              video_hash=video_hash, engine_settings=engine_settings):
         # Optical Flow
-        flow = cv2.calcOpticalFlowFarneback(
-            prev_gray, gray,
-            None, 0.5, 3, 15, 3, 5, 1.2, 0
-        )
-
-        mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-        avg_motion = np.mean(mag)
+        avg_motion = metrics.avg_motion
         motion_history.append(avg_motion)
 
         # =========================
@@ -101,59 +103,38 @@ if st.button("▶ Start Detection") and cap is not None:
         # =========================
         # RISK CLASSIFICATION
         # =========================
-        if avg_motion < VERY_LOW:
-            risk = "VERY LOW"
-            color = (200, 200, 200)
-            reason = "Minimal movement"
-
-        elif avg_motion < NORMAL:
-            risk = "NORMAL"
-            color = (0, 255, 0)
-            reason = "Stable crowd flow"
-
-        elif avg_motion < ELEVATED:
-            risk = "ELEVATED"
-            color = (0, 255, 255)
-            reason = "Increased activity"
-
-        elif avg_motion < HIGH:
-            risk = "HIGH RISK"
-            color = (0, 165, 255)
-            reason = "Abnormal acceleration"
-
-        else:
-            risk = "CRITICAL"
-            color = (0, 0, 255)
-            reason = "Possible panic or stampede"
-
-        if spike > 2.0:
-            risk = "CRITICAL"
+        current = thresholds.get()
+        level, spike_detected = classify_level(avg_motion, spike, current)
+        risk = current["labels"][level]
+        color, reason = LEVEL_STYLE[level]
+
+        if spike_detected:
             reason = "Sudden motion spike detected"
 
-        risk_counter[risk] += 1
+        risk_counter[level] += 1
 
         # =========================
         # DISPLAY ON FRAME
         # =========================
-        cv2.putText(frame, f"Risk: {risk}", (20, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-        cv2.putText(frame, f"Motion: {avg_motion:.2f}", (20, 80),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, reason, (20, 120),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        # (no frame when replaying cached metrics)
+        if frame is not None:
+            cv2.putText(frame, f"Risk: {risk}", (20, 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+            cv2.putText(frame, f"Motion: {avg_motion:.2f}", (20, 80),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            cv2.putText(frame, reason, (20, 120),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
 
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        video_box.image(frame_rgb, channels="RGB")
+            video_box.image(frame, channels="BGR")
 
         # =========================
         # ALERT LOG
         # =========================
-        if risk in ["HIGH RISK", "CRITICAL"]:
+        if level in ["high", "critical"]:
             timestamp = time.strftime("%H:%M:%S")
             alerts.append(f"{timestamp} | {risk} | {reason}")
             alert_box.warning("\n".join(alerts[-5:]))
 
-        prev_gray = gray
         prev_motion = avg_motion
         frame_count += 1
 
@@ -163,16 +144,19 @@ if st.button("▶ Start Detection") and cap is not None:
     # FINAL RESULTS SECTION ⭐
     # =========================
     avg_video_motion = np.mean(motion_history)
-    dominant_risk = max(risk_counter, key=risk_counter.get)
+    dominant_level = max(risk_counter, key=risk_counter.get)
+    labels = thresholds.get()["labels"]
+    dominant_risk = labels[dominant_level]
 
-    if dominant_risk in ["VERY LOW", "NORMAL"]:
+    if dominant_level in ["very_low", "normal"]:
         verdict = "🟢 SAFE CROWD"
-    elif dominant_risk == "ELEVATED":
+    elif dominant_level == "elevated":
         verdict = "🟡 CROWD NEEDS MONITORING"
     else:
         verdict = "🔴 DANGEROUS CROWD CONDITION"
 
     fps = frame_count / (time.time() - start_time)
+    distribution = "\n".join(f"- {labels[level]}: {risk_counter[level]}" for level in LEVELS)
 
     result_box.success(f"""
 ### 📊 FINAL ANALYSIS REPORT
@@ -184,11 +168,7 @@ if st.button("▶ Start Detection") and cap is not None:
 * Processing Speed: *{fps:.2f} FPS*
 
 #### Risk Distribution:
-- VERY LOW: {risk_counter["VERY LOW"]}
-- NORMAL: {risk_counter["NORMAL"]}
-- ELEVATED: {risk_counter["ELEVATED"]}
-- HIGH RISK: {risk_counter["HIGH RISK"]}
-- CRITICAL: {risk_counter["CRITICAL"]}
+{distribution}
 """)
 
 else:
@@ -0,0 +1,340 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+
+# =========================
+# LUMA-ONLY DECODE
+# =========================
+# Optical flow only needs brightness. With CAP_PROP_CONVERT_RGB off the
+# decoder hands back its native picture instead of converting every
+# frame to BGR: the Y plane of planar YUV (FFmpeg), packed YUYV, or the
+# still compressed JPEG of MJPEG webcams (V4L2). luma() takes the
+# brightness out of each; JPEGs are decoded straight to gray, at 1/2,
+# 1/4 or 1/8 size when that still covers max_width. to_colour() turns
+# the same raw frame into BGR and is only called for the frames a
+# dashboard shows. Decoders that only expose the Y plane (FFmpeg files
+# in current OpenCV) give a gray preview.
+#
+# The flag is set once when the capture opens: FFmpeg returns garbage
+# if it is switched between raw and BGR mid-stream.
+#
+# Decoded video stores Y in limited ("TV") range, 16..235, while the
+# BGR2GRAY values the thresholds are calibrated on span 0..255. Left
+# alone that lowers contrast and average motion by several percent, so
+# luma_range "auto" stretches Y back to full range with a lookup table,
+# except for MJPEG streams, whose JPEG frames are full range already;
+# "limited" / "full" force either reading.
+JPEG_REDUCED = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+]
+
+
+_quiet_lock = threading.Lock()
+_quiet = {"depth": 0, "level": None}
+
+
+class quiet_decoder:
+    """
+    Raises OpenCV's log level to ERROR while raw frames are retrieved:
+    FFmpeg warns on every raw YUV frame it returns. The level is global,
+    so it is saved by the first capture to enter and restored by the
+    last to leave, and the rest of the process keeps its warnings.
+    """
+
+    def __enter__(self):
+        with _quiet_lock:
+            if _quiet["depth"] == 0:
+                _quiet["level"] = cv2.utils.logging.getLogLevel()
+                cv2.utils.logging.setLogLevel(cv2.utils.logging.LOG_LEVEL_ERROR)
+            _quiet["depth"] += 1
+
+    def __exit__(self, *exc):
+        with _quiet_lock:
+            _quiet["depth"] -= 1
+            if _quiet["depth"] == 0:
+                cv2.utils.logging.setLogLevel(_quiet["level"])
+
+
+FULL_RANGE_CODECS = {"MJPG", "JPEG", "mjpg", "jpeg"}
+LIMITED_TO_FULL = np.clip(np.round((np.arange(256) - 16) * 255.0 / 219), 0, 255).astype(np.uint8)
+
+
+def load_capture_settings(path=THRESHOLDS_FILE, camera=None):
+    settings = {"luma": True, "luma_range": "auto"}
+    settings.update(merged_section(load_config(path), "capture", camera))
+    return settings
+
+
+def raw_layout(raw, height, width):
+    """("bgr" | "yuyv" | "i420" | "y" | "jpeg", raw reshaped to match) for a CONVERT_RGB-off frame"""
+    if raw.ndim == 3:
+        return ("bgr" if raw.shape[2] == 3 else "yuyv"), raw
+    if raw.shape == (height, width):
+        return "y", raw
+    if raw.size == height * width * 3 // 2:
+        return "i420", raw.reshape(height * 3 // 2, width)
+    if raw.size == height * width * 2:
+        return "yuyv", raw.reshape(height, width, 2)
+    return "jpeg", raw.reshape(-1)
+
+
+def range_table(luma_range="auto", fourcc=0):
+    """
+    LIMITED_TO_FULL when Y of this stream is limited range, else None.
+    An unknown codec (fourcc 0, or -1 from a source that did not open)
+    gets no table.
+    """
+    if luma_range == "full":
+        return None
+    if luma_range == "limited":
+        return LIMITED_TO_FULL
+    fourcc = int(fourcc)
+    if fourcc <= 0:
+        return None
+    codec = fourcc.to_bytes(4, "little").decode("latin-1")
+    return None if codec in FULL_RANGE_CODECS else LIMITED_TO_FULL
+
+
+def luma(raw, height, width, max_width=None, table=None):
+    """
+    Gray image from a frame read with CONVERT_RGB off (None if it cannot
+    be decoded). table (range_table()) is applied to YUV luma.
+    """
+    layout, raw = raw_layout(raw, height, width)
+    if layout in ("y", "i420", "yuyv"):
+        if layout == "i420":
+            raw = raw[:height]
+        elif layout == "yuyv":
+            raw = cv2.cvtColor(raw, cv2.COLOR_YUV2GRAY_YUY2)
+        return raw if table is None else cv2.LUT(raw, table)
+    if layout == "bgr":
+        return cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY)
+    flag = cv2.IMREAD_GRAYSCALE
+    for factor, reduced in JPEG_REDUCED:
+        if max_width and width // factor >= max_width:
+            flag = reduced
+            break
+    return cv2.imdecode(raw, flag)
+
+
+def to_colour(raw, height, width, table=None):
+    """BGR image from the same raw frame luma() was given"""
+    layout, raw = raw_layout(raw, height, width)
+    if layout == "bgr":
+        return raw
+    if layout == "y":
+        return cv2.cvtColor(raw if table is None else cv2.LUT(raw, table), cv2.COLOR_GRAY2BGR)
+    if layout == "i420":
+        return cv2.cvtColor(raw, cv2.COLOR_YUV2BGR_I420)
+    if layout == "yuyv":
+        return cv2.cvtColor(raw, cv2.COLOR_YUV2BGR_YUY2)
+    return cv2.imdecode(raw, cv2.IMREAD_COLOR)
+
+
+class LumaCapture:
+    """
+    cv2.VideoCapture whose read() returns gray frames decoded without a
+    BGR conversion (see luma()); colour() gives the last frame in BGR.
+    If the native layout cannot be decoded the capture is reopened as
+    an ordinary BGR one at the same position.
+    """
+
+    def __init__(self, source, max_width=None, luma_range="auto"):
+        self.source = source
+        self.max_width = max_width
+        self.enabled = True
+        self.raw = None
+        self.cap = cv2.VideoCapture(source)
+        self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.table = None
+        if self.cap.isOpened():
+            self.table = range_table(luma_range, self.cap.get(cv2.CAP_PROP_FOURCC))
+
+    @property
+    def decode(self):
+        if not self.enabled:
+            return "bgr"
+        return "luma" if self.table is None else "luma_full"
+
+    def _fallback(self):
+        position = self.cap.get(cv2.CAP_PROP_POS_FRAMES)
+        self.cap.release()
+        self.cap = cv2.VideoCapture(self.source)
+        if position > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        self.enabled = False
+
+    def read(self):
+        if not self.enabled:
+            ret, raw = self.cap.read()
+            self.raw = raw
+            return ret, raw
+        with quiet_decoder():
+            ret, raw = self.cap.read()
+        self.raw = raw
+        if not ret:
+            return ret, raw
+        gray = luma(raw, self.height, self.width, self.max_width, self.table)
+        if gray is None:
+            self._fallback()
+            return self.read()
+        return True, gray
+
+    def colour(self):
+        if self.raw is None or not self.enabled:
+            return self.raw
+        return to_colour(self.raw, self.height, self.width, self.table)
+
+    def grab(self):
+        return self.cap.grab()
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+def open_capture(source, settings=None, max_width=None):
+    """LumaCapture when the "capture" section has luma on, else cv2.VideoCapture"""
+    settings = settings or load_capture_settings()
+    if settings["luma"]:
+        return LumaCapture(source, max_width, settings.get("luma_range", "auto"))
+    return cv2.VideoCapture(source)
+
+
+def preview_frame(cap, frame):
+    """BGR version of the frame just read from cap, for display"""
+    colour = getattr(cap, "colour", None)
+    return colour() if colour is not None else frame
+
+
+# =========================
+# THREADED CAPTURE
+# =========================
+BUFFER_FRAMES = 2
+
+
+class ThreadedCapture:
+    """
+    Drop-in stand-in for cv2.VideoCapture that decodes on a producer
+    thread into a small ring buffer, so slow analysis or rendering never
+    stalls capture.
+
+    With drop_oldest=True (live sources) read() always returns the
+    freshest frame and older ones are discarded and counted in
+    `dropped`. With drop_oldest=False (files) the producer waits for
+    room instead, so every frame is analysed.
+
+    After each read(), `frame_time` holds the wall-clock capture time of
+    the returned frame and `frames_skipped` how many source frames were
+    dropped since the previous read, which iter_frames() folds into the
+    frame gap.
+
+    luma=True decodes through LumaCapture: read() returns gray frames
+    and colour() the last one in BGR.
+    """
+
+    def __init__(self, source, buffer_frames=BUFFER_FRAMES, drop_oldest=True, luma=False, max_width=None,
+                 luma_range="auto"):
+        self.cap = LumaCapture(source, max_width, luma_range) if luma else cv2.VideoCapture(source)
+        if drop_oldest:
+            # Keep the driver from queueing frames behind our back
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.buffer = deque()
+        self.buffer_frames = max(1, buffer_frames)
+        self.drop_oldest = drop_oldest
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.eof = False
+
+        self.seq = 0
+        self.last_seq = 0
+        self.dropped = 0
+        self.frames_skipped = 0
+        self.frame_time = None
+        self.raw = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        if self.cap.isOpened():
+            self.thread.start()
+        else:
+            self.eof = True
+
+    def _run(self):
+        while True:
+            ret, frame = self.cap.read()
+            captured_at = time.time()
+            with self.cond:
+                if not ret or self.stopped:
+                    self.eof = True
+                    self.cond.notify_all()
+                    return
+                self.seq += 1
+                if self.drop_oldest:
+                    if len(self.buffer) >= self.buffer_frames:
+                        self.buffer.popleft()
+                        self.dropped += 1
+                else:
+                    while len(self.buffer) >= self.buffer_frames and not self.stopped:
+                        self.cond.wait()
+                self.buffer.append((self.seq, captured_at, frame, getattr(self.cap, "raw", frame)))
+                self.cond.notify_all()
+
+    def read(self):
+        with self.cond:
+            while not self.buffer and not self.eof:
+                self.cond.wait()
+            if not self.buffer:
+                return False, None
+            if self.drop_oldest:
+                seq, captured_at, frame, raw = self.buffer.pop()
+                self.dropped += len(self.buffer)
+                self.buffer.clear()
+            else:
+                seq, captured_at, frame, raw = self.buffer.popleft()
+            self.frames_skipped = seq - self.last_seq - 1
+            self.last_seq = seq
+            self.frame_time = captured_at
+            self.raw = raw
+            self.cond.notify_all()
+        return True, frame
+
+    def grab(self):
+        ret, _ = self.read()
+        return ret
+
+    def colour(self):
+        if isinstance(self.cap, LumaCapture) and self.raw is not None:
+            return to_colour(self.raw, self.cap.height, self.cap.width, self.cap.table)
+        return self.raw
+
+    @property
+    def decode(self):
+        return getattr(self.cap, "decode", "bgr")
+
+    def latency(self):
+        """Seconds since the frame last returned by read() was captured"""
+        if self.frame_time is None:
+            return 0.0
+        return time.time() - self.frame_time
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        self.cap.release()
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+# =========================
+# HOT-RELOADING CONFIG
+# =========================
+CHECK_EVERY = 1.0   # seconds between mtime checks
+
+
+def load_config(path=THRESHOLDS_FILE):
+    """Whole thresholds.json as a dict ({} if the file is missing)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def update_config_file(updates, path=THRESHOLDS_FILE):
+    """Merges {section: {key: value}} into thresholds.json, keeping other sections"""
+    config = load_config(path)
+    for section, values in updates.items():
+        config.setdefault(section, {}).update(values)
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+class ConfigWatcher:
+    """
+    Keeps thresholds.json in memory and re-reads it when its mtime
+    changes, checking at most every `check_every` seconds so get() is
+    cheap enough to call every frame. A half-written file that fails
+    to parse keeps the previous config until the next good save.
+    `version` goes up on every successful reload.
+    """
+
+    def __init__(self, path=THRESHOLDS_FILE, check_every=CHECK_EVERY):
+        self.path = path
+        self.check_every = check_every
+        self.config = {}
+        self.mtime = None
+        self.version = 0
+        self.last_check = 0.0
+        self.reload()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def reload(self):
+        self.last_check = time.time()
+        mtime = self._mtime()
+        try:
+            config = load_config(self.path)
+        except (ValueError, OSError):
+            return False
+        self.config = config
+        self.mtime = mtime
+        self.version += 1
+        return True
+
+    def get(self):
+        now = time.time()
+        if now - self.last_check >= self.check_every:
+            self.last_check = now
+            if self._mtime() != self.mtime:
+                self.reload()
+        return self.config
+
+
+# =========================
+# OVERRIDES
+# =========================
+def merged_section(config, section, camera=None, zone=None):
+    """
+    One config section with overrides applied in order: global, then
+    cameras.<camera>, then cameras.<camera>.zones.<zone>.
+    """
+    values = dict(config.get(section, {}))
+    camera_config = config.get("cameras", {}).get(camera, {}) if camera is not None else {}
+    values.update(camera_config.get(section, {}))
+    if zone is not None:
+        values.update(camera_config.get("zones", {}).get(zone, {}).get(section, {}))
+    return values
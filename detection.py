@@ -1,112 +1,277 @@
-import cv2
-import numpy as np
+import argparse
+import glob
 import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import cv2
+
+from capture import open_capture
+from config import THRESHOLDS_FILE, load_config, update_config_file
+from motion_engine import MotionEngine, load_engine_settings, load_sampling, iter_frames
+from stats import StreamingStats, BIN_WIDTH
+from telemetry import NULL_TELEMETRY, Telemetry, load_telemetry_settings, shared_telemetry, start_profile, stop_profile
 
 # =========================
 # VIDEO LIST (ADD ALL HERE)
 # =========================
+# Used when no directory / glob is given on the command line.
 VIDEO_FOLDER = "data"
 
 VIDEO_FILES = [
     "crowd1.mp4"
 ]
 
-# =========================
-# STORAGE
-# =========================
-all_avg_movements = []
-all_max_movements = []
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+# Long videos are split into chunks of this many frames so one video
+# can keep several cores busy.
+CHUNK_FRAMES = 1500
+
+# Each threshold is this percentile of motion in normal footage.
+# Overridden by the "calibration.percentiles" section of thresholds.json.
+THRESHOLD_PERCENTILES = {
+    "very_low": 25,
+    "normal": 75,
+    "elevated": 95,
+    "high": 99,
+    "critical": 99.9,
+}
+
+
+def load_percentiles(path=THRESHOLDS_FILE):
+    percentiles = dict(THRESHOLD_PERCENTILES)
+    percentiles.update(load_config(path).get("calibration", {}).get("percentiles", {}))
+    return percentiles
+
+
+def thresholds_from_stats(stats, percentiles):
+    """Percentile thresholds, nudged apart so the ladder is strictly increasing"""
+    thresholds = {}
+    previous = None
+    for level, q in percentiles.items():
+        value = stats.percentile(q)
+        if previous is not None and value <= previous:
+            value = previous + BIN_WIDTH
+        thresholds[level] = value
+        previous = value
+    return thresholds
+
+
+def find_videos(patterns):
+    """Expands directories and globs into a sorted list of video files"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += [os.path.join(pattern, f) for f in os.listdir(pattern)
+                      if f.lower().endswith(VIDEO_EXTENSIONS)]
+        else:
+            paths += glob.glob(pattern)
+    return sorted(set(paths))
+
+
+def split_chunks(video_path, chunk_frames=CHUNK_FRAMES):
+    """Splits a video into (path, start, end) frame ranges"""
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    if total <= 0:
+        # Unknown length (some containers): analyse in one piece
+        return [(video_path, 0, None)]
+    return [(video_path, start, min(start + chunk_frames, total))
+            for start in range(0, total, chunk_frames)]
 
-print("\n📊 CROWD CALIBRATION STARTED\n")
 
 # =========================
-# PROCESS EACH VIDEO
+# ONE CHUNK (WORKER)
 # =========================
-for video_name in VIDEO_FILES:
-    video_path = os.path.join(VIDEO_FOLDER, video_name)
-    cap = cv2.VideoCapture(video_path)
+def analyse_chunk(chunk, instrument=False):
+    """
+    Motion statistics for the frame pairs ending in [start, end). The
+    chunk seeks to the frame before `start` so no pair is lost at the
+    boundary. Returns (video_path, motion StreamingStats, motion gate
+    change-score StreamingStats, telemetry snapshot or None) for
+    merging; stage timings are only kept when `instrument`.
+    """
+    video_path, start, end = chunk
+    stats = StreamingStats()
+    changes = StreamingStats()
+    telemetry = Telemetry() if instrument else NULL_TELEMETRY
 
+    # The gate only measures here (floor 0): every frame gets full flow
+    settings = load_engine_settings()
+    settings["gate"] = dict(settings["gate"], enabled=True, floor=0.0)
+    settings["density"] = {"enabled": False}
+
+    cap = open_capture(video_path, max_width=settings["process_width"])
     if not cap.isOpened():
-        print(f"❌ Could not open {video_name}")
-        continue
+        cap.release()
+        return video_path, stats, changes, None
 
+    prime_at = max(0, start - 1)
+    if prime_at:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, prime_at)
     ret, prev_frame = cap.read()
     if not ret:
-        print(f"❌ Could not read first frame of {video_name}")
         cap.release()
-        continue
+        return video_path, stats, changes, None
 
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
+    engine = MotionEngine(**settings, telemetry=telemetry)
+    engine.process(prev_frame)
+    position = prime_at
 
-    frame_count = 0
-    motion_values = []
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
+    telemetry.start()
+    for gap, frame in iter_frames(cap, load_sampling()["stride"]):
+        position += gap
+        if end is not None and position >= end:
             break
+        if telemetry:
+            telemetry.lap("decode")
+        metrics = engine.process(frame, gap)
+        stats.add(metrics.avg_motion)
+        if metrics.change_score is not None:
+            changes.add(metrics.change_score)
+        if telemetry:
+            telemetry.lap("stats")
+            telemetry.inc("frames_total")
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    cap.release()
+    return video_path, stats, changes, telemetry.snapshot() if instrument else None
 
-        # Optical Flow (Farneback)
-        flow = cv2.calcOpticalFlowFarneback(
-            prev_gray, gray,
-            None,
-            0.5, 3, 15, 3, 5, 1.2, 0
-        )
 
-        magnitude, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-        avg_motion = np.mean(magnitude)
+def merge_chunks(results, telemetry=NULL_TELEMETRY, pending=0):
+    """
+    Combines chunk statistics into one accumulator per video (plus one
+    for all gate change scores), folding each chunk's stage timings into
+    `telemetry` as it arrives. Returns (videos, changes).
+    """
+    videos = {}
+    changes = StreamingStats()
+    for video_path, stats, chunk_changes, snapshot in results:
+        changes.merge(chunk_changes)
+        if snapshot is not None:
+            telemetry.merge(snapshot)
+        pending -= 1
+        telemetry.set("queue_depth", max(pending, 0))
+        if stats.count == 0:
+            continue
+        videos.setdefault(video_path, StreamingStats()).merge(stats)
+    return videos, changes
 
-        motion_values.append(avg_motion)
 
-        prev_gray = gray
-        frame_count += 1
+# =========================
+# CALIBRATION
+# =========================
+def print_stats(stats):
+    s = stats.summary()
+    print(f"Frames analysed : {s['frames']}")
+    print(f"Min movement   : {s['min']:.2f}")
+    print(f"Median / MAD   : {s['median']:.2f} / {s['mad']:.2f}")
+    print(f"Mean / Std     : {s['mean']:.2f} / {s['std']:.2f}")
+    print(f"p95 / p99      : {s['p95']:.2f} / {s['p99']:.2f}")
+    print(f"Max movement   : {s['max']:.2f}")
 
-    cap.release()
 
-    if len(motion_values) == 0:
-        print(f"⚠️ No data for {video_name}")
-        continue
+def calibrate(video_paths, workers=None, chunk_frames=CHUNK_FRAMES, write=True, telemetry_settings=None):
+    print("\n📊 CROWD CALIBRATION STARTED\n")
 
-    min_motion = np.min(motion_values)
-    avg_motion = np.mean(motion_values)
-    max_motion = np.max(motion_values)
+    telemetry_settings = telemetry_settings or load_telemetry_settings()
+    telemetry = shared_telemetry(telemetry_settings)
+    profiler = start_profile(telemetry_settings["profile"])
 
-    all_avg_movements.append(avg_motion)
-    all_max_movements.append(max_motion)
+    chunks = [c for path in video_paths for c in split_chunks(path, chunk_frames)]
+    analyse = partial(analyse_chunk, instrument=bool(telemetry))
+    telemetry.set("queue_depth", len(chunks))
 
-    print(f"🎥 {video_name}")
-    print(f"Frames analysed : {frame_count}")
-    print(f"Min movement   : {min_motion:.2f}")
-    print(f"Avg movement   : {avg_motion:.2f}")
-    print(f"Max movement   : {max_motion:.2f}")
-    print("-" * 40)
+    if profiler is not None:
+        # Worker processes are invisible to cProfile, so profile in-process
+        print(f"🎞️ {len(video_paths)} videos → {len(chunks)} chunks in-process (profiling)\n")
+        videos, changes = merge_chunks(map(analyse, chunks), telemetry, len(chunks))
+    else:
+        print(f"🎞️ {len(video_paths)} videos → {len(chunks)} chunks across {workers or os.cpu_count()} workers\n")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            videos, changes = merge_chunks(pool.map(analyse, chunks), telemetry, len(chunks))
+    stop_profile(profiler, telemetry_settings["profile"])
+    if telemetry:
+        stages = ", ".join(f"{s}={ms:.2f}ms" for s, ms in telemetry.summary().items())
+        print(f"⏱️ Mean stage latency: {stages}\n")
 
-# =========================
-# GLOBAL THRESHOLD CALCULATION
-# =========================
-print("\n✅ FINAL CALIBRATION SUMMARY\n")
-
-global_avg = np.mean(all_avg_movements)
-global_max = np.mean(all_max_movements)
-
-VERY_LOW = global_avg * 0.5
-NORMAL = global_avg
-ELEVATED = global_avg * 2
-HIGH = global_avg * 4
-CRITICAL = global_max * 0.4
-
-print("📌 GLOBAL STATISTICS")
-print(f"Average of averages : {global_avg:.2f}")
-print(f"Average of maximums : {global_max:.2f}\n")
-
-print("🚦 SUGGESTED FINAL THRESHOLDS")
-print(f"VERY_LOW   = {VERY_LOW:.2f}")
-print(f"NORMAL     = {NORMAL:.2f}")
-print(f"ELEVATED   = {ELEVATED:.2f}")
-print(f"HIGH       = {HIGH:.2f}")
-print(f"CRITICAL   = {CRITICAL:.2f}")
-
-print("\n🎯 Calibration completed successfully.")
-print("➡️ Use these thresholds in detection.py / app.py")
\ No newline at end of file
+    overall = StreamingStats()
+    used_videos = 0
+
+    for video_path in video_paths:
+        video_name = os.path.basename(video_path)
+        stats = videos.get(video_path)
+        if stats is None:
+            print(f"⚠️ No data for {video_name}")
+            continue
+
+        overall.merge(stats)
+        used_videos += 1
+        print(f"🎥 {video_name}")
+        print_stats(stats)
+        print("-" * 40)
+
+    if overall.count == 0:
+        print("\n❌ No usable calibration footage.")
+        return None
+
+    # =========================
+    # GLOBAL THRESHOLD CALCULATION
+    # =========================
+    print("\n✅ FINAL CALIBRATION SUMMARY\n")
+
+    percentiles = load_percentiles()
+    thresholds = thresholds_from_stats(overall, percentiles)
+
+    print("📌 GLOBAL STATISTICS")
+    print_stats(overall)
+    print()
+
+    print("🚦 FINAL THRESHOLDS")
+    for level, value in thresholds.items():
+        print(f"{level.upper():<10} = {value:.2f}   (p{percentiles[level]:g})")
+
+    # Motion gate floor: the change score at the VERY LOW percentile, so
+    # only frames about as still as the calmest normal footage skip flow
+    gate_floor = round(changes.percentile(percentiles["very_low"]), 2) if changes.count else None
+    if gate_floor is not None:
+        print(f"{'GATE FLOOR':<10} = {gate_floor:.2f}   (change score, p{percentiles['very_low']:g})")
+
+    if write:
+        update = {
+            "motion_thresholds": {k: round(v, 2) for k, v in thresholds.items()},
+            "metadata": {"calibration": f"Calibrated {datetime.now():%Y-%m-%d} from {used_videos} videos "
+                                        f"({overall.count} frames), percentile thresholds"},
+        }
+        if gate_floor is not None:
+            update["motion_gate"] = {"floor": gate_floor}
+        update_config_file(update)
+        print(f"\n🎯 Calibration completed. Thresholds written to {THRESHOLDS_FILE}")
+    return thresholds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Derive motion thresholds from normal crowd footage")
+    parser.add_argument("videos", nargs="*", help="Video files, directories or globs (default: VIDEO_FILES)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU cores)")
+    parser.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES, help="Frames per chunk")
+    parser.add_argument("--dry-run", action="store_true", help="Print thresholds without writing thresholds.json")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve stage metrics on this port at /metrics")
+    parser.add_argument("--profile", default=None, help="Write a cProfile dump here (analyses in-process)")
+    args = parser.parse_args()
+
+    telemetry_settings = load_telemetry_settings()
+    if args.metrics_port is not None:
+        telemetry_settings.update(enabled=True, port=args.metrics_port)
+    if args.profile:
+        telemetry_settings["profile"] = args.profile
+
+    if args.videos:
+        paths = find_videos(args.videos)
+    else:
+        paths = [os.path.join(VIDEO_FOLDER, name) for name in VIDEO_FILES]
+
+    calibrate(paths, args.workers, args.chunk_frames, write=not args.dry_run,
+              telemetry_settings=telemetry_settings)
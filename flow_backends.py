@@ -0,0 +1,299 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# =========================
+# FARNEBACK PARAMETERS
+# =========================
+# Same values every entry point used to hard-code:
+# calcOpticalFlowFarneback(prev, next, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+FARNEBACK_PARAMS = {
+    "pyr_scale": 0.5,
+    "levels": 3,
+    "winsize": 15,
+    "iterations": 3,
+    "poly_n": 5,
+    "poly_sigma": 1.2,
+    "flags": 0,
+    # Used instead of levels / iterations once the previous flow seeds the
+    # next frame (None keeps the cold values)
+    "warm_levels": None,
+    "warm_iterations": None,
+}
+
+LK_GRID_STEP = 16
+LK_PARAMS = {
+    "winSize": (15, 15),
+    "maxLevel": 2,
+    "criteria": (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+}
+
+
+# =========================
+# BACKENDS
+# =========================
+# Every backend turns a pair of gray frames into (magnitude, flow): a 2-D
+# magnitude image plus the matching (dx, dy) component images, or None
+# when the backend has no direction. Flow backends report pixel displacement at
+# the processing resolution (pixel_units=True) so MotionEngine can
+# normalise it to reference_width; frame differencing reports intensity
+# change and relies on its gain.
+#
+# compute() is compute_flow() followed by magnitude(); the two halves are
+# separate so benchmarks and profilers can time them apart.
+#
+# Returned arrays are buffers the backend reuses on the next call, so
+# callers must finish with them (or copy) before computing again.
+#
+# frame_width is the width of the whole processed frame when the images
+# passed in are a crop of it (MotionEngine's region of interest), so
+# scale-dependent parameters follow the frame, not the crop.
+class FlowBackend:
+    pixel_units = True
+    frame_width = None
+
+    def reset(self):
+        pass
+
+    def compute(self, prev_gray, gray):
+        self.compute_flow(prev_gray, gray)
+        return self.magnitude()
+
+
+def buffers_for(backend, shape):
+    """
+    (Re)allocates the backend's flow and magnitude buffers when the frame
+    size changes. Returns True when the existing buffers were kept, i.e.
+    the previous flow is a valid initial estimate.
+    """
+    if backend.flow is not None and backend.flow.shape[:2] == shape:
+        return True
+    backend.flow = np.zeros(shape + (2,), dtype=np.float32)
+    backend.dx = np.empty(shape, dtype=np.float32)
+    backend.dy = np.empty(shape, dtype=np.float32)
+    backend.mag = np.empty(shape, dtype=np.float32)
+    return False
+
+
+def flow_magnitude(backend):
+    """
+    Splits backend.flow into its dx / dy buffers and writes the magnitude
+    (no angle) into backend.mag, without allocating
+    """
+    cv2.extractChannel(backend.flow, 0, backend.dx)
+    cv2.extractChannel(backend.flow, 1, backend.dy)
+    cv2.magnitude(backend.dx, backend.dy, backend.mag)
+    return backend.mag, (backend.dx, backend.dy)
+
+
+class FarnebackBackend(FlowBackend):
+    """
+    Dense Farneback flow, the reference backend. From the second pair on
+    the previous flow seeds the solver (OPTFLOW_USE_INITIAL_FLOW), which
+    lets warm_levels / warm_iterations trim the pyramid work.
+    """
+
+    def __init__(self, params=None, reference_width=None):
+        self.params = dict(FARNEBACK_PARAMS)
+        if params:
+            self.params.update(params)
+        self.reference_width = reference_width
+        self.reset()
+
+    def reset(self):
+        self.flow = None
+        self.mag = None
+
+    def window_size(self, width):
+        """Farneback window scaled so it covers the same scene area as at reference_width"""
+        winsize = self.params["winsize"]
+        if not self.reference_width:
+            return winsize
+        scaled = int(round(winsize * width / float(self.reference_width)))
+        return max(5, scaled | 1)
+
+    def compute_flow(self, prev_gray, gray):
+        p = self.params
+        warm = buffers_for(self, gray.shape)
+        levels, iterations, flags = p["levels"], p["iterations"], p["flags"]
+        if warm:
+            levels = p["warm_levels"] or levels
+            iterations = p["warm_iterations"] or iterations
+            flags |= cv2.OPTFLOW_USE_INITIAL_FLOW
+        cv2.calcOpticalFlowFarneback(
+            prev_gray, gray, self.flow,
+            p["pyr_scale"], levels, self.window_size(self.frame_width or gray.shape[1]),
+            iterations, p["poly_n"], p["poly_sigma"], flags
+        )
+
+    def magnitude(self):
+        return flow_magnitude(self)
+
+
+class DISBackend(FlowBackend):
+    """cv2.DISOpticalFlow with the ultrafast or fast preset"""
+
+    PRESETS = {
+        "ultrafast": cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST,
+        "fast": cv2.DISOPTICAL_FLOW_PRESET_FAST,
+        "medium": cv2.DISOPTICAL_FLOW_PRESET_MEDIUM,
+    }
+
+    def __init__(self, preset="ultrafast"):
+        self.dis = cv2.DISOpticalFlow_create(self.PRESETS[preset])
+        self.reset()
+
+    def reset(self):
+        self.flow = None
+        self.mag = None
+
+    def compute_flow(self, prev_gray, gray):
+        # DIS treats a non-empty flow argument as its initial estimate
+        buffers_for(self, gray.shape)
+        self.dis.calc(prev_gray, gray, self.flow)
+
+    def magnitude(self):
+        return flow_magnitude(self)
+
+
+class LucasKanadeBackend(FlowBackend):
+    """
+    Sparse pyramidal Lucas-Kanade on a fixed point grid. The magnitude
+    image is one value per grid point, so zones still line up spatially.
+    Points that fail to track count as no motion.
+    """
+
+    def __init__(self, grid_step=LK_GRID_STEP, params=None):
+        self.grid_step = grid_step
+        self.params = dict(LK_PARAMS)
+        if params:
+            self.params.update(params)
+        self.reset()
+
+    def reset(self):
+        self.grid_shape = None
+        self.points = None
+
+    def _grid(self, shape):
+        if self.grid_shape != shape:
+            h, w = shape
+            half = self.grid_step // 2
+            ys = np.arange(half, h, self.grid_step, dtype=np.float32)
+            xs = np.arange(half, w, self.grid_step, dtype=np.float32)
+            gx, gy = np.meshgrid(xs, ys)
+            self.points = np.stack([gx, gy], axis=-1).reshape(-1, 1, 2)
+            self.grid_shape = shape
+            self.grid_size = (len(ys), len(xs))
+        return self.points
+
+    def compute_flow(self, prev_gray, gray):
+        points = self._grid(gray.shape)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **self.params)
+        flow = (moved - points).reshape(-1, 2)
+        flow[status.ravel() == 0] = 0.0
+        self.dx = np.ascontiguousarray(flow[:, 0], dtype=np.float32).reshape(self.grid_size)
+        self.dy = np.ascontiguousarray(flow[:, 1], dtype=np.float32).reshape(self.grid_size)
+
+    def magnitude(self):
+        return cv2.magnitude(self.dx, self.dy), (self.dx, self.dy)
+
+
+class FrameDiffBackend(FlowBackend):
+    """Absolute frame difference; cheapest, measured in gray levels"""
+    pixel_units = False
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.diff = None
+        self.mag = None
+
+    def compute_flow(self, prev_gray, gray):
+        if self.diff is None or self.diff.shape != gray.shape:
+            self.diff = np.empty(gray.shape, dtype=np.uint8)
+            self.mag = np.empty(gray.shape, dtype=np.float32)
+        cv2.absdiff(prev_gray, gray, self.diff)
+
+    def magnitude(self):
+        np.copyto(self.mag, self.diff)
+        return self.mag, None
+
+
+BACKENDS = ["farneback", "dis_ultrafast", "dis_fast", "lk", "framediff"]
+
+
+def make_backend(name="farneback", flow_params=None, reference_width=None):
+    """Builds a backend by the name used in thresholds.json"""
+    if name == "farneback":
+        return FarnebackBackend(flow_params, reference_width)
+    if name == "dis_ultrafast":
+        return DISBackend("ultrafast")
+    if name == "dis_fast":
+        return DISBackend("fast")
+    if name == "lk":
+        return LucasKanadeBackend()
+    if name == "framediff":
+        return FrameDiffBackend()
+    raise ValueError(f"Unknown flow backend '{name}', expected one of {BACKENDS}")
+
+
+# =========================
+# BACKEND CALIBRATION
+# =========================
+def fit_backend_gains(video_paths, backends=BACKENDS, max_frames=300):
+    """
+    Runs every backend next to Farneback on the same footage and fits a
+    least-squares gain (through the origin) mapping each backend's average
+    motion onto the Farneback scale. Those gains go into the "flow.gains"
+    section of thresholds.json so the one set of motion thresholds holds
+    for every backend.
+    """
+    from motion_engine import MotionEngine, load_engine_settings, iter_metrics
+
+    settings = load_engine_settings()
+    settings.pop("gains", None)
+    settings.pop("gate", None)      # gated frames would read as zero for every backend
+    settings["density"] = {"enabled": False}
+    sums = {name: [0.0, 0.0] for name in backends}
+
+    for path in video_paths:
+        readings = {}
+        for name in ["farneback"] + list(backends):
+            if name in readings:
+                continue
+            cap = cv2.VideoCapture(path)
+            engine = MotionEngine(**dict(settings, backend=name, gain=1.0))
+            values = []
+            for _, metrics in iter_metrics(cap, engine):
+                values.append(metrics.avg_motion)
+                if len(values) >= max_frames:
+                    break
+            cap.release()
+            readings[name] = np.array(values)
+
+        reference = readings["farneback"]
+        for name in backends:
+            n = min(len(reference), len(readings[name]))
+            sums[name][0] += float(np.dot(reference[:n], readings[name][:n]))
+            sums[name][1] += float(np.dot(readings[name][:n], readings[name][:n]))
+
+    return {name: (num / den if den > 0 else 1.0) for name, (num, den) in sums.items()}
+
+
+if __name__ == "__main__":
+    # python flow_backends.py normal1.mp4 normal2.mp4 ...
+    from config import THRESHOLDS_FILE, update_config_file
+
+    if len(sys.argv) < 2:
+        print("Usage: python flow_backends.py VIDEO [VIDEO ...]")
+        sys.exit(1)
+
+    gains = fit_backend_gains(sys.argv[1:])
+    for name, gain in gains.items():
+        print(f"{name:<14} gain = {gain:.3f}")
+
+    update_config_file({"flow": {"gains": {name: round(g, 3) for name, g in gains.items()}}})
+    print(f"✅ Gains written to {os.path.basename(THRESHOLDS_FILE)}")
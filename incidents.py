@@ -0,0 +1,153 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+from risk import LEVELS
+
+# =========================
+# INCIDENT SETTINGS
+# =========================
+# "incidents" section of thresholds.json. An incident opens after
+# enter_frames consecutive frames at enter_level or above and closes
+# after exit_frames consecutive frames below exit_level, so a crowd
+# hovering around one threshold does not open and close it every frame.
+DEFAULT_INCIDENT_SETTINGS = {
+    "enter_level": "high",
+    "exit_level": "elevated",
+    "enter_frames": 3,
+    "exit_frames": 15,
+}
+
+
+def load_incident_settings(path=THRESHOLDS_FILE, camera=None):
+    settings = dict(DEFAULT_INCIDENT_SETTINGS)
+    settings.update(merged_section(load_config(path), "incidents", camera))
+    return settings
+
+
+@dataclass
+class Incident:
+    """One debounced run of high-risk frames"""
+    id: int
+    camera: str
+    start_time: float
+    start_frame: int
+    end_time: float = None
+    end_frame: int = None
+    last_time: float = None
+    last_frame: int = 0
+    frames: int = 0
+    peak_motion: float = 0.0
+    peak_level: str = ""
+    spikes: int = 0
+    zones: set = field(default_factory=set)
+
+    @property
+    def duration(self):
+        end = self.end_time if self.end_time is not None else self.last_time
+        return max(0.0, (end or self.start_time) - self.start_time)
+
+    def to_dict(self, labels=None):
+        """JSON-ready record; peak_risk uses the display labels when given"""
+        labels = labels or {}
+
+        def stamp(t):
+            return None if t is None else datetime.fromtimestamp(t).isoformat(timespec="milliseconds")
+
+        return {
+            "incident": self.id,
+            "camera": self.camera,
+            "start": stamp(self.start_time),
+            "end": stamp(self.end_time),
+            "duration_s": round(self.duration, 2),
+            "start_frame": self.start_frame,
+            "end_frame": self.end_frame,
+            "frames": self.frames,
+            "peak_motion": round(self.peak_motion, 4),
+            "peak_risk": labels.get(self.peak_level, self.peak_level),
+            "spikes": self.spikes,
+            "zones": sorted(self.zones),
+        }
+
+
+# =========================
+# STATE MACHINE
+# =========================
+class IncidentTracker:
+    """
+    Turns per-frame risk levels into incidents. update() returns a list
+    of (event, Incident) pairs, empty on most frames:
+
+      "start"     enter_frames in a row reached enter_level
+      "escalate"  an open incident reached a higher level than before
+      "end"       exit_frames in a row fell below exit_level
+
+    Frames in the entry streak count toward the incident, so its start
+    is the first hot frame, and it ends at the last frame that was not
+    calm.
+    """
+
+    def __init__(self, camera=None, enter_level="high", exit_level="elevated",
+                 enter_frames=3, exit_frames=15):
+        self.camera = camera
+        self.enter_rank = LEVELS.index(enter_level)
+        self.exit_rank = LEVELS.index(exit_level)
+        self.enter_frames = max(1, int(enter_frames))
+        self.exit_frames = max(1, int(exit_frames))
+        self.count = 0
+        self.active = None
+        self.candidate = None
+        self.calm = 0
+
+    def _observe(self, incident, rank, level, motion, when, frame, zones, spike):
+        incident.frames += 1
+        incident.last_time = when
+        incident.last_frame = frame
+        incident.peak_motion = max(incident.peak_motion, motion)
+        incident.spikes += int(bool(spike))
+        incident.zones.update(zones)
+        if not incident.peak_level or rank > LEVELS.index(incident.peak_level):
+            incident.peak_level = level
+            return True
+        return False
+
+    def update(self, level, motion, when, frame=0, zones=(), spike=False):
+        rank = LEVELS.index(level)
+        events = []
+
+        if self.active is None:
+            if rank < self.enter_rank:
+                self.candidate = None
+                return events
+            if self.candidate is None:
+                self.candidate = Incident(self.count + 1, self.camera, when, frame)
+            self._observe(self.candidate, rank, level, motion, when, frame, zones, spike)
+            if self.candidate.frames >= self.enter_frames:
+                self.active, self.candidate = self.candidate, None
+                self.count += 1
+                self.calm = 0
+                events.append(("start", self.active))
+            return events
+
+        incident = self.active
+        if rank < self.exit_rank:
+            self.calm += 1
+            if self.calm >= self.exit_frames:
+                events.append(("end", self.close()))
+            return events
+
+        self.calm = 0
+        if self._observe(incident, rank, level, motion, when, frame, zones, spike):
+            events.append(("escalate", incident))
+        return events
+
+    def close(self):
+        """Ends the open incident (if any) at its last hot frame and returns it"""
+        incident = self.active
+        if incident is not None:
+            incident.end_time = incident.last_time
+            incident.end_frame = incident.last_frame
+        self.active = None
+        self.candidate = None
+        self.calm = 0
+        return incident
@@ -1,8 +1,11 @@
 import cv2
-import numpy as np
 import time
 import os
 
+from motion_engine import MotionEngine, load_engine_settings
+from risk import LiveThresholds, classify_level
+from incidents import IncidentTracker, load_incident_settings
+
 # --- PATH SETUP ---
 # Adding 'r' before the string tells Python to treat backslashes as literal characters
 folder_path = r"C:\Users\panka\PycharmProjects\PythonProject1\data"
@@ -36,37 +39,40 @@ if not ret:
 
 # Resizing for performance
 W, H = 640, 480
-prev_gray = cv2.cvtColor(cv2.resize(first_frame, (W, H)), cv2.COLOR_BGR2GRAY)
+engine = MotionEngine(**load_engine_settings(camera=video_files[0]))
+engine.process(cv2.resize(first_frame, (W, H)))
+thresholds = LiveThresholds(video_files[0])
+incidents = IncidentTracker(video_files[0], **load_incident_settings(camera=video_files[0]))
+fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
 
 while cap.isOpened():
     ret, frame = cap.read()
     if not ret: break
 
     frame_resized = cv2.resize(frame, (W, H))
-    gray = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2GRAY)
 
     # MEMBER 2: Motion Engine
-    flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-    mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-    motion_score = np.mean(mag)
+    motion_score = engine.process(frame_resized).avg_motion
 
-    # MEMBER 3: Risk Logic
+    # MEMBER 3: Risk Logic (thresholds.json, hot-reloaded)
+    level, _ = classify_level(motion_score, 0.0, thresholds.get())
     risk, message = "LOW", "Normal Activity"
-    if motion_score > 3.0:
+    if level in ["high", "critical"]:
         risk, message = "HIGH", "ANOMALY: Sudden Running Detected"
-    elif motion_score > 1.2:
+    elif level == "elevated":
         risk, message = "MEDIUM", "CAUTION: Increased Crowd Speed"
 
-    # MEMBER 4: Logging
-    if risk != "LOW":
-        log_event(risk, motion_score, message)
+    # MEMBER 4: Logging (one line per incident start / end, not per frame)
+    frame_no = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    for event, incident in incidents.update(level, motion_score, frame_no / fps, frame_no):
+        log_event(risk, incident.peak_motion,
+                  f"INCIDENT #{incident.id} {event.upper()} | {message} | Duration={incident.duration:.1f}s")
 
     # UI Feedback
     color = (0, 0, 255) if risk == "HIGH" else (0, 255, 0)
     cv2.putText(frame_resized, f"RISK: {risk}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
     cv2.imshow("Crowd Safety Monitor", frame_resized)
 
-    prev_gray = gray
     if cv2.waitKey(1) & 0xFF == ord('q'): break
 
 log_file.close()
@@ -0,0 +1,323 @@
+import cv2
+import numpy as np
+from dataclasses import dataclass, field
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+from density import DEFAULT_DENSITY, DensityEstimator
+from flow_backends import make_backend
+from telemetry import NULL_TELEMETRY
+from zones import RegionOfInterest, ZoneLayout
+
+# =========================
+# PROCESSING RESOLUTION
+# =========================
+# Frames are downscaled to PROCESS_WIDTH before flow. Motion is then
+# reported in pixels at REFERENCE_WIDTH (the width thresholds.json was
+# calibrated at) so thresholds mean the same at any processing size.
+PROCESS_WIDTH = 640
+REFERENCE_WIDTH = 640
+
+# =========================
+# MOTION GATE
+# =========================
+# Before dense flow, a gate compares a `width`-pixel thumbnail of the
+# frame with the previous one (mean absolute difference in gray levels
+# per frame). Below `floor` the scene is treated as static: flow is
+# skipped and the frame reports zero motion (VERY LOW). Every
+# `force_every` gated frames in a row one frame gets full flow anyway.
+# detection.py calibrates the floor ("motion_gate" in thresholds.json).
+DEFAULT_GATE = {"enabled": False, "width": 80, "floor": 0.0, "force_every": 25}
+
+
+def load_engine_settings(path=THRESHOLDS_FILE, camera=None):
+    """
+    Reads the "resolution", "flow" and "zone_layout" sections of
+    thresholds.json (with the camera's overrides) as MotionEngine kwargs
+    """
+    config = load_config(path)
+    settings = {
+        "process_width": PROCESS_WIDTH,
+        "reference_width": REFERENCE_WIDTH,
+        "backend": "farneback",
+        "gains": {},
+    }
+    settings.update(merged_section(config, "resolution", camera))
+    flow = merged_section(config, "flow", camera)
+    settings["flow_params"] = flow.pop("params", None)
+    settings.update(flow)
+    layout = merged_section(config, "zone_layout", camera)
+    settings["zone_grid"] = tuple(layout.get("grid", (2, 2)))
+    settings["zone_polygons"] = layout.get("polygons") or None
+    settings["directions"] = layout.get("directions", True)
+    settings["roi"] = merged_section(config, "roi", camera).get("polygons") or None
+    settings["gate"] = merged_section(config, "motion_gate", camera)
+    settings["density"] = merged_section(config, "density", camera)
+    return settings
+
+
+def load_sampling(path=THRESHOLDS_FILE, camera=None):
+    """Reads the "sampling" section of thresholds.json as iter_metrics kwargs"""
+    settings = {"stride": 1, "target_fps": None}
+    settings.update(merged_section(load_config(path), "sampling", camera))
+    return settings
+
+
+# =========================
+# FRAME METRICS
+# =========================
+@dataclass
+class FrameMetrics:
+    """Motion measured between one frame and the previous one"""
+    index: int
+    avg_motion: float
+    frame_gap: int = 1
+    frame_number: int = 0
+    zones: dict = field(default_factory=dict)
+    zone_directions: dict = field(default_factory=dict)
+    zone_risks: dict = field(default_factory=dict)
+    active_zone: str = ""
+    change_score: float = None
+    gated: bool = False
+    density: float = 0.0
+    zone_density: dict = field(default_factory=dict)
+
+
+def to_gray(frame):
+    """Returns a single-channel copy of a BGR frame (gray frames pass through)"""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def resize_for_processing(gray, process_width=None, scale=None):
+    """Downscales a gray frame to the processing width (never upscales)"""
+    h, w = gray.shape
+    if scale is not None:
+        target_w = int(round(w * scale))
+    elif process_width is not None:
+        target_w = process_width
+    else:
+        return gray
+    if target_w >= w:
+        return gray
+    target_h = max(1, int(round(h * target_w / w)))
+    return cv2.resize(gray, (target_w, target_h), interpolation=cv2.INTER_AREA)
+
+
+# =========================
+# MOTION ENGINE
+# =========================
+class MotionEngine:
+    """
+    Headless optical-flow engine shared by app.py, calibration.py,
+    detection.py and main.py. Feed frames in order with process();
+    the first frame only primes the engine and returns None.
+
+    process_width / scale pick the processing resolution (scale wins if
+    both are set, None for both keeps full resolution). Reported motion
+    is normalised to reference_width and the flow window is scaled with
+    it, so thresholds hold at any processing size.
+
+    backend picks the flow algorithm (see flow_backends.BACKENDS). Its
+    output is multiplied by gain, or by gains[backend] when gain is not
+    given, to bring it onto the Farneback scale thresholds.json uses.
+
+    zone_grid (rows, cols) or zone_polygons ({name: [[x, y], ...]} in
+    0..1 frame fractions) pick the zones reported per frame; with
+    directions=False the per-zone flow direction is skipped.
+
+    roi ([[x, y], ...] polygons in 0..1 frame fractions) restricts all
+    of the above to a region of interest (see zones.RegionOfInterest).
+
+    gate ({enabled, width, floor, force_every}, see DEFAULT_GATE) skips
+    flow on static frames; those come back with gated=True.
+
+    density (see density.DEFAULT_DENSITY) adds the foreground share of
+    the frame and of each zone, gated frames included.
+
+    telemetry (see telemetry.py) receives gray / gate / density / flow /
+    magnitude / zones stage timings; iter_metrics adds decode.
+    """
+
+    def __init__(self, flow_params=None, process_width=PROCESS_WIDTH,
+                 scale=None, reference_width=REFERENCE_WIDTH,
+                 backend="farneback", gain=None, gains=None,
+                 zone_grid=(2, 2), zone_polygons=None, directions=True,
+                 roi=None, gate=None, density=None, telemetry=None):
+        self.process_width = process_width
+        self.scale = scale
+        self.reference_width = reference_width
+        self.backend_name = backend
+        self.backend = make_backend(backend, flow_params, reference_width)
+        if gain is None:
+            gain = (gains or {}).get(backend, 1.0)
+        self.gain = gain
+        self.zone_layout = ZoneLayout(zone_grid, zone_polygons)
+        self.roi = RegionOfInterest(roi)
+        self.directions = directions
+        self.gate = dict(DEFAULT_GATE)
+        self.gate.update(gate or {})
+        density = dict(DEFAULT_DENSITY, **(density or {}))
+        self.density = None
+        if density["enabled"]:
+            self.density = DensityEstimator(**density, zone_grid=zone_grid, zone_polygons=zone_polygons)
+        self.telemetry = telemetry or NULL_TELEMETRY
+        self.reset()
+
+    def reset(self):
+        self.backend.reset()
+        if self.density is not None:
+            self.density.reset()
+        self.prev_gray = None
+        self.prev_thumb = None
+        self.gated_run = 0
+        self.frame_index = 0
+        self.frame_number = 0
+
+    def motion_scale(self, width):
+        """Factor converting backend output at the given width to reference units"""
+        if not self.reference_width or not self.backend.pixel_units:
+            return self.gain
+        return self.gain * self.reference_width / float(width)
+
+    def change_score(self, gray, frame_gap=1):
+        """Gate score: mean absolute thumbnail difference to the previous frame, per frame"""
+        thumb = resize_for_processing(gray, self.gate["width"])
+        prev, self.prev_thumb = self.prev_thumb, thumb
+        if prev is None or prev.shape != thumb.shape:
+            return None
+        return cv2.norm(thumb, prev, cv2.NORM_L1) / thumb.size / max(1, frame_gap)
+
+    def gated(self, score):
+        """True when flow can be skipped for a frame with this change score"""
+        force_every = self.gate["force_every"]
+        if score is None or score >= self.gate["floor"]:
+            return False
+        return not force_every or self.gated_run < force_every
+
+    def process(self, frame, frame_gap=1):
+        """
+        frame_gap is how many source frames separate this frame from the
+        previous one; motion is divided by it so a strided run reports
+        the same per-frame magnitudes as a full-rate run.
+        """
+        telemetry = self.telemetry
+        gray = resize_for_processing(to_gray(frame), self.process_width, self.scale)
+        width = gray.shape[1]
+        if self.roi:
+            gray = self.roi.crop(gray)
+            self.backend.frame_width = width
+        if telemetry:
+            telemetry.lap("gray")
+        score = None
+        if self.gate["enabled"]:
+            score = self.change_score(gray, frame_gap)
+            if telemetry:
+                telemetry.lap("gate")
+        density = (0.0, {})
+        if self.density is not None:
+            density = self.density.update(gray, self.roi)
+            if telemetry:
+                telemetry.lap("density")
+        if self.prev_gray is None:
+            self.prev_gray = gray
+            return None
+
+        if self.gated(score):
+            # Static scene: no flow, and no stale warm start for the next one
+            self.gated_run += 1
+            self.backend.reset()
+            if telemetry:
+                telemetry.inc("gated_frames_total")
+            zones = dict.fromkeys(self.zone_layout.names, 0.0)
+            return self._advance(gray, frame_gap, 0.0, zones, {}, score, density, gated=True)
+        self.gated_run = 0
+
+        self.backend.compute_flow(self.prev_gray, gray)
+        if telemetry:
+            telemetry.lap("flow")
+        mag, flow = self.backend.magnitude()
+        factor = self.motion_scale(width) / max(1, frame_gap)
+        if factor != 1.0:
+            mag *= factor
+        avg_motion = self.roi.mean(mag) if self.roi else float(np.mean(mag))
+        if telemetry:
+            telemetry.lap("magnitude")
+
+        zones, directions = self.zone_layout.measure(mag, flow if self.directions else None, self.roi)
+        if telemetry:
+            telemetry.lap("zones")
+        return self._advance(gray, frame_gap, avg_motion, zones, directions, score, density)
+
+    def _advance(self, gray, frame_gap, avg_motion, zones, directions, score, density, gated=False):
+        metrics = FrameMetrics(
+            index=self.frame_index,
+            avg_motion=avg_motion,
+            frame_gap=frame_gap,
+            frame_number=self.frame_number + frame_gap,
+            zones=zones,
+            zone_directions=directions,
+            active_zone=max(zones, key=zones.get) if zones else "",
+            change_score=score,
+            gated=gated,
+            density=density[0],
+            zone_density=density[1],
+        )
+
+        self.prev_gray = gray
+        self.frame_index += 1
+        self.frame_number += frame_gap
+        return metrics
+
+
+# =========================
+# CAPTURE HELPERS
+# =========================
+def frame_stride(cap, stride=1, target_fps=None):
+    """
+    Number of source frames to advance per analysed frame. target_fps
+    wins over stride when the capture reports its own frame rate.
+    """
+    if target_fps:
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        if source_fps > 0:
+            return max(1, int(round(source_fps / float(target_fps))))
+    return max(1, int(stride or 1))
+
+
+def iter_frames(cap, stride=1):
+    """
+    Yields (frame_gap, frame) until the capture runs dry. Frames in
+    between are grab()bed without decoding to BGR; frames a threaded
+    capture dropped on its own are counted in the gap too.
+    """
+    while True:
+        gap = 1
+        for _ in range(stride - 1):
+            if not cap.grab():
+                return
+            gap += 1 + getattr(cap, "frames_skipped", 0)
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield gap + getattr(cap, "frames_skipped", 0), frame
+
+
+def iter_metrics(cap, engine=None, stride=1, target_fps=None):
+    """
+    Yields (frame, FrameMetrics) for every analysed frame pair in the
+    capture. If the engine has already been primed with a first frame,
+    analysis continues from it.
+    """
+    if engine is None:
+        engine = MotionEngine()
+    telemetry = engine.telemetry
+    stride = frame_stride(cap, stride, target_fps)
+    telemetry.start()
+    for gap, frame in iter_frames(cap, stride):
+        if telemetry:
+            telemetry.lap("decode")
+        metrics = engine.process(frame, gap)
+        if metrics is not None:
+            yield frame, metrics
+        telemetry.start()
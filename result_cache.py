@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+from motion_engine import FrameMetrics, frame_stride, iter_metrics
+
+# =========================
+# RESULT CACHE
+# =========================
+# Per-frame motion metrics of a whole video, stored on disk under a key
+# made of the video's content hash (see uploads.py) and everything that
+# changes the measured motion: flow backend and parameters, gains,
+# processing resolution, zone layout, stride and decode path (luma or
+# BGR, see capture.py). Thresholds, trend and
+# incident settings are not part of the key, so changing them
+# re-classifies a cached video without running optical flow again.
+#
+# Entries are .npz files; the least recently used go first once the
+# folder is over max_bytes.
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "dir": "cache",
+    "max_bytes": 2 * 1024 ** 3,
+}
+CACHE_VERSION = 4       # bump when FrameMetrics or the engine maths change
+
+
+def load_cache_settings(path=THRESHOLDS_FILE):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(merged_section(load_config(path), "result_cache"))
+    return settings
+
+
+def cache_key(video_hash, engine_settings, stride=1, decode="bgr"):
+    """
+    Key for one video analysed with one engine configuration.
+    engine_settings is the load_engine_settings() dict; stride is the
+    effective frame step (frame_stride()).
+    """
+    identity = {"version": CACHE_VERSION, "video": video_hash, "stride": int(stride), "decode": decode}
+    identity.update(engine_settings)
+    identity.pop("telemetry", None)
+    blob = json.dumps(identity, sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """get() / put() of FrameMetrics lists by cache_key()"""
+
+    def __init__(self, settings=None):
+        self.settings = settings or load_cache_settings()
+        self.folder = self.settings["dir"]
+
+    def __bool__(self):
+        return bool(self.settings["enabled"])
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + ".npz")
+
+    def get(self, key):
+        """Cached metrics for key, or None on a miss"""
+        if not self:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                metrics = _unpack(data)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path)
+        return metrics
+
+    def put(self, key, metrics):
+        """metrics is a FrameMetrics list or a MetricsRecorder"""
+        if not self or not len(metrics):
+            return None
+        arrays = metrics.pack() if isinstance(metrics, MetricsRecorder) else _pack(metrics)
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(key)
+        part = os.path.join(self.folder, uuid.uuid4().hex + ".part.npz")
+        np.savez(part, **arrays)
+        os.replace(part, path)
+        self.prune(keep=path)
+        return path
+
+    def prune(self, keep=None):
+        """Drops least recently used entries until the folder fits max_bytes"""
+        if not os.path.isdir(self.folder):
+            return []
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        removed = []
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.settings["max_bytes"]:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed.append(path)
+        return removed
+
+
+class MetricsRecorder:
+    """
+    Collects FrameMetrics straight into the flat arrays the cache file
+    holds (one row per frame, one column per zone; capacity doubles as
+    needed), so recording a long video costs a few dozen bytes per frame
+    instead of a FrameMetrics with three dicts.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = max(1, capacity)
+        self.names = None
+        self.count = 0
+        self.with_directions = False
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, zones):
+        n = self.capacity
+        self.columns = {
+            "index": np.zeros(n, dtype=np.int64),
+            "avg_motion": np.zeros(n, dtype=np.float64),
+            "frame_gap": np.zeros(n, dtype=np.int32),
+            "frame_number": np.zeros(n, dtype=np.int64),
+            "zones": np.zeros((n, zones), dtype=np.float64),
+            "change_score": np.zeros(n, dtype=np.float64),
+            "gated": np.zeros(n, dtype=bool),
+            "density": np.zeros(n, dtype=np.float64),
+            "zone_density": np.zeros((n, zones), dtype=np.float64),
+            "directions": np.zeros((n, zones), dtype=np.float64),
+        }
+
+    def append(self, m):
+        if self.names is None:
+            self.names = list(m.zones)
+            self._allocate(len(self.names))
+        if self.count == self.capacity:
+            self.capacity *= 2
+            for name, column in self.columns.items():
+                grown = np.zeros((self.capacity,) + column.shape[1:], dtype=column.dtype)
+                grown[:self.count] = column
+                self.columns[name] = grown
+        c, i = self.columns, self.count
+        c["index"][i] = m.index
+        c["avg_motion"][i] = m.avg_motion
+        c["frame_gap"][i] = m.frame_gap
+        c["frame_number"][i] = m.frame_number
+        c["zones"][i] = [m.zones[z] for z in self.names]
+        c["change_score"][i] = np.nan if m.change_score is None else m.change_score
+        c["gated"][i] = m.gated
+        c["density"][i] = m.density
+        c["zone_density"][i] = [m.zone_density.get(z, 0.0) for z in self.names]
+        # Gated frames have no directions (NaN rows)
+        c["directions"][i] = [m.zone_directions.get(z, np.nan) for z in self.names]
+        self.with_directions = self.with_directions or bool(m.zone_directions)
+        self.count += 1
+
+    def pack(self):
+        arrays = {name: column[:self.count] for name, column in self.columns.items()}
+        arrays["zone_names"] = np.array(self.names, dtype=str)
+        if not self.with_directions:
+            del arrays["directions"]
+        return arrays
+
+
+def _pack(metrics):
+    """FrameMetrics list -> flat arrays (one row per frame, one column per zone)"""
+    recorder = MetricsRecorder(len(metrics))
+    for m in metrics:
+        recorder.append(m)
+    return recorder.pack()
+
+
+def _unpack(data):
+    names = data["zone_names"].tolist()
+    zones = data["zones"].tolist()
+    directions = data["directions"].tolist() if "directions" in data else None
+    zone_density = data["zone_density"].tolist()
+    metrics = []
+    for i, (index, motion, gap, number, score, gated, density) in enumerate(zip(
+            data["index"].tolist(), data["avg_motion"].tolist(),
+            data["frame_gap"].tolist(), data["frame_number"].tolist(),
+            data["change_score"].tolist(), data["gated"].tolist(), data["density"].tolist())):
+        zone_motion = dict(zip(names, zones[i]))
+        zone_directions = {}
+        if directions is not None and not gated:
+            zone_directions = dict(zip(names, directions[i]))
+        metrics.append(FrameMetrics(
+            index=index,
+            avg_motion=motion,
+            frame_gap=gap,
+            frame_number=number,
+            zones=zone_motion,
+            zone_directions=zone_directions,
+            active_zone=max(zone_motion, key=zone_motion.get) if zone_motion else "",
+            change_score=None if score != score else score,
+            gated=gated,
+            density=density,
+            zone_density=dict(zip(names, zone_density[i])),
+        ))
+    return metrics
+
+
+# =========================
+# CACHED ANALYSIS
+# =========================
+def iter_cached_metrics(cap, engine, stride=1, target_fps=None, video_hash=None, engine_settings=None, cache=None):
+    """
+    iter_metrics() with the result cache in front of it. On a hit it
+    yields (None, FrameMetrics) from disk without decoding a frame; on
+    a miss it runs the engine as usual and stores the metrics once the
+    whole video has been analysed (runs stopped early are not cached),
+    recording them as compact arrays (MetricsRecorder) meanwhile.
+    Without a video_hash (live feeds) it is plain iter_metrics().
+    """
+    cache = ResultCache() if cache is None else cache
+    if not video_hash or not cache:
+        yield from iter_metrics(cap, engine, stride, target_fps)
+        return
+
+    key = cache_key(video_hash, engine_settings or {}, frame_stride(cap, stride, target_fps),
+                    getattr(cap, "decode", "bgr"))
+    cached = cache.get(key)
+    if cached is not None:
+        for metrics in cached:
+            yield None, metrics
+        return
+
+    recorded = MetricsRecorder()
+    for frame, metrics in iter_metrics(cap, engine, stride, target_fps):
+        recorded.append(metrics)
+        yield frame, metrics
+    cache.put(key, recorded)
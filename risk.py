@@ -0,0 +1,193 @@
+import numpy as np
+
+from config import THRESHOLDS_FILE, ConfigWatcher, load_config, merged_section
+
+# =========================
+# DEFAULT THRESHOLDS
+# =========================
+# Same values app.py ships with; thresholds.json overrides them.
+LEVELS = ["very_low", "normal", "elevated", "high", "critical"]
+
+DEFAULT_THRESHOLDS = {
+    "motion": {
+        "very_low": 0.60,
+        "normal": 1.20,
+        "elevated": 2.50,
+        "high": 4.00,
+        "critical": 6.00,
+    },
+    "spike_enabled": True,
+    "spike_threshold": 2.0,
+    "spike_risk": "CRITICAL",
+    "trend_enabled": True,
+    "trend_slope": 1.5,             # motion units per second over the "trend" window
+    "trend_risk": "HIGH RISK",
+    "density_enabled": True,
+    "density": {                    # foreground share of the frame (0..1)
+        "elevated": 0.35,
+        "high": 0.55,
+        "critical": 0.75,
+    },
+    "density_moving_level": "normal",
+    "labels": {
+        "very_low": "VERY LOW",
+        "normal": "NORMAL",
+        "elevated": "ELEVATED",
+        "high": "HIGH RISK",
+        "critical": "CRITICAL",
+    },
+}
+
+
+def parse_thresholds(config, camera=None, zone=None):
+    """
+    motion_thresholds, spike_detection, trend_detection, density_fusion
+    and risk_labels from a loaded thresholds.json, with any camera /
+    zone overrides applied.
+    """
+    spike = merged_section(config, "spike_detection", camera, zone)
+    trend = merged_section(config, "trend_detection", camera, zone)
+    density = merged_section(config, "density_fusion", camera, zone)
+    thresholds = {
+        "motion": dict(DEFAULT_THRESHOLDS["motion"]),
+        "spike_enabled": spike.get("enabled", DEFAULT_THRESHOLDS["spike_enabled"]),
+        "spike_threshold": spike.get("spike_threshold", DEFAULT_THRESHOLDS["spike_threshold"]),
+        "spike_risk": spike.get("override_risk", DEFAULT_THRESHOLDS["spike_risk"]),
+        "trend_enabled": trend.get("enabled", DEFAULT_THRESHOLDS["trend_enabled"]),
+        "trend_slope": trend.get("slope_threshold", DEFAULT_THRESHOLDS["trend_slope"]),
+        "trend_risk": trend.get("override_risk", DEFAULT_THRESHOLDS["trend_risk"]),
+        "density_enabled": density.get("enabled", DEFAULT_THRESHOLDS["density_enabled"]),
+        "density": dict(DEFAULT_THRESHOLDS["density"], **density.get("ratios", {})),
+        "density_moving_level": density.get("moving_level", DEFAULT_THRESHOLDS["density_moving_level"]),
+        "labels": dict(DEFAULT_THRESHOLDS["labels"]),
+    }
+    thresholds["motion"].update(merged_section(config, "motion_thresholds", camera, zone))
+    thresholds["labels"].update(merged_section(config, "risk_labels", camera, zone))
+    return thresholds
+
+
+def load_thresholds(path=THRESHOLDS_FILE, camera=None, zone=None):
+    """One-off read of the thresholds for a camera (and optionally a zone)"""
+    return parse_thresholds(load_config(path), camera, zone)
+
+
+class LiveThresholds:
+    """
+    Thresholds for one camera that follow edits to thresholds.json
+    without restarting the stream. Parsed thresholds are cached per
+    zone and dropped whenever the watcher reloads the file.
+    """
+
+    def __init__(self, camera=None, watcher=None):
+        self.camera = camera
+        self.watcher = watcher or ConfigWatcher()
+        self.version = None
+        self.cache = {}
+        self.edges = {}
+
+    def get(self, zone=None):
+        config = self.watcher.get()
+        if self.watcher.version != self.version:
+            self.cache = {}
+            self.edges = {}
+            self.version = self.watcher.version
+        if zone not in self.cache:
+            self.cache[zone] = parse_thresholds(config, self.camera, zone)
+        return self.cache[zone]
+
+    def zone_edges(self, zones):
+        """(zones x 4) array of the very_low..high cut-offs for each zone"""
+        key = tuple(zones)
+        self.get()
+        if key not in self.edges:
+            self.edges[key] = np.array([[self.get(z)["motion"][level] for level in LEVELS[:-1]]
+                                        for z in zones], dtype=np.float64)
+        return self.edges[key]
+
+    def poll(self):
+        """True once after each reload of thresholds.json"""
+        seen = self.version
+        self.get()
+        return seen is not None and self.version != seen
+
+
+# =========================
+# RISK CLASSIFICATION
+# =========================
+def classify_level(motion, spike, thresholds):
+    """
+    Maps smoothed motion (and the jump since the previous frame) to a
+    level in LEVELS, the same ladder app.py uses. Returns
+    (level, spike_detected).
+    """
+    motion_levels = thresholds["motion"]
+
+    level = LEVELS[-1]
+    for candidate in LEVELS[:-1]:
+        if motion < motion_levels[candidate]:
+            level = candidate
+            break
+
+    spike_detected = thresholds["spike_enabled"] and spike > thresholds["spike_threshold"]
+    if spike_detected:
+        level = level_for_label(thresholds["spike_risk"], thresholds)
+    return level, spike_detected
+
+
+def apply_trend(level, slope, thresholds):
+    """
+    Stampede prediction: a sustained rise in motion (slope per second
+    over the trend window) raises the level to at least trend_risk.
+    Never lowers a level. Returns (level, trend_detected).
+    """
+    if not thresholds["trend_enabled"] or slope <= thresholds["trend_slope"]:
+        return level, False
+    floor = level_for_label(thresholds["trend_risk"], thresholds)
+    return max(level, floor, key=LEVELS.index), True
+
+
+def apply_density(level, density, thresholds):
+    """
+    Fused density + motion rule. The foreground share climbs its own
+    ladder (density.elevated / high / critical); a crowd that dense is
+    raised to that level when it is also moving (level at or above
+    density_moving_level), and to ELEVATED when it stands still. Never
+    lowers a level. Returns (level, dense) where dense means at least
+    the elevated ratio was reached.
+    """
+    if not thresholds["density_enabled"]:
+        return level, False
+    ratios = thresholds["density"]
+    dense_level = None
+    for candidate in ("critical", "high", "elevated"):
+        if density >= ratios[candidate]:
+            dense_level = candidate
+            break
+    if dense_level is None:
+        return level, False
+    if LEVELS.index(level) < LEVELS.index(thresholds["density_moving_level"]):
+        dense_level = "elevated"
+    return max(level, dense_level, key=LEVELS.index), True
+
+
+def level_for_label(label, thresholds):
+    """Inverse of risk_labels (unknown labels count as critical)"""
+    for level, name in thresholds["labels"].items():
+        if name == label:
+            return level
+    return LEVELS[-1]
+
+
+def classify_zones(metrics, thresholds):
+    """
+    Fills metrics.zone_risks with each zone's risk label, using the
+    zone's own thresholds (cameras.<id>.zones.<zone> overrides). One
+    vectorised comparison covers every zone.
+    """
+    names = list(metrics.zones)
+    if not names:
+        return {}
+    motion = np.fromiter(metrics.zones.values(), dtype=np.float64, count=len(names))
+    indices = (motion[:, None] >= thresholds.zone_edges(names)).sum(axis=1)
+    metrics.zone_risks = {z: thresholds.get(z)["labels"][LEVELS[i]] for z, i in zip(names, indices)}
+    return metrics.zone_risks
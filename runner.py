@@ -0,0 +1,254 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+import cv2
+
+from capture import load_capture_settings, open_capture
+from motion_engine import MotionEngine, load_engine_settings, load_sampling
+from config import ConfigWatcher
+from incidents import IncidentTracker, load_incident_settings
+from risk import LiveThresholds, apply_density, apply_trend, classify_level
+from trends import MotionTrends, load_trend_windows
+
+# =========================
+# RUNNER SETTINGS
+# =========================
+REPORT_EVERY = 5.0       # seconds between per-stream FPS reports
+MAX_STRIDE = 10          # back-off never skips more than this
+BEHIND_RATIO = 0.9       # below 90% of real time counts as falling behind
+
+
+def parse_source(source):
+    """Device indices arrive as strings on the command line"""
+    return int(source) if str(source).isdigit() else source
+
+
+def is_live(source):
+    """Cameras and network streams run in real time; local files do not"""
+    return isinstance(source, int) or not os.path.isfile(source)
+
+
+# =========================
+# ONE STREAM
+# =========================
+class Stream:
+    """Capture, motion engine and risk state for a single source"""
+
+    def __init__(self, source, watcher, stride=1, realtime=None):
+        self.source = source
+        self.name = str(source)
+        engine_settings = load_engine_settings(camera=self.name)
+        self.cap = open_capture(source, load_capture_settings(camera=self.name), engine_settings["process_width"])
+        self.engine = MotionEngine(**engine_settings)
+        self.thresholds = LiveThresholds(self.name, watcher)
+        self.incidents = IncidentTracker(self.name, **load_incident_settings(camera=self.name))
+        self.events = []
+        self.stride = max(1, stride)
+        self.realtime = is_live(source) if realtime is None else realtime
+        self.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+        # Sized for every frame and fed footage time, so the windows keep
+        # their length in seconds when report() raises the stride
+        self.trends = MotionTrends(load_trend_windows(camera=self.name), self.source_fps)
+        self.prev_motion = 0.0
+        self.frames = 0
+        self.window_frames = 0
+        self.window_start = time.time()
+        self.start_time = time.time()
+        self.finished = not self.cap.isOpened()
+
+        if not self.finished:
+            ret, frame = self.cap.read()
+            if ret:
+                self.engine.process(frame)
+            else:
+                self.finished = True
+
+    def step(self):
+        """Analyses the next frame; returns a result dict or None when done"""
+        gap = 1
+        for _ in range(self.stride - 1):
+            if not self.cap.grab():
+                self.close()
+                return None
+            gap += 1
+        ret, frame = self.cap.read()
+        if not ret:
+            self.close()
+            return None
+
+        metrics = self.engine.process(frame, gap)
+        self.trends.push(metrics.avg_motion, metrics.frame_number / self.source_fps)
+        smooth_motion = self.trends.mean("smooth")
+        slope = self.trends.slope_per_second("trend")
+        current = self.thresholds.get()
+        level, spike_detected = classify_level(smooth_motion, smooth_motion - self.prev_motion, current)
+        level, trend_detected = apply_trend(level, slope, current)
+        level, dense = apply_density(level, metrics.density, current)
+        risk = current["labels"][level]
+        self.prev_motion = smooth_motion
+        self.frames += 1
+        self.window_frames += 1
+
+        when = time.time() if self.realtime else self.start_time + metrics.frame_number / self.source_fps
+        for event, incident in self.incidents.update(level, smooth_motion, when,
+                                                     metrics.frame_number, [metrics.active_zone], spike_detected):
+            self.events.append(self._incident(event, incident))
+
+        return {
+            "type": "frame",
+            "source": self.name,
+            "frame": metrics.frame_number,
+            "time": time.time(),
+            "motion": round(smooth_motion, 4),
+            "spike": spike_detected,
+            "trend": round(slope, 4),
+            "rising": trend_detected,
+            "density": round(metrics.density, 4),
+            "dense": dense,
+            "zone": metrics.active_zone,
+            "risk": risk,
+        }
+
+    def report(self):
+        """Per-stream FPS since the last report; strides up if behind real time"""
+        elapsed = time.time() - self.window_start
+        fps = self.window_frames / elapsed if elapsed > 0 else 0.0
+        needed = self.source_fps / self.stride
+        behind = self.realtime and fps < needed * BEHIND_RATIO
+        if behind and self.stride < MAX_STRIDE:
+            self.stride += 1
+        self.window_frames = 0
+        self.window_start = time.time()
+        return {
+            "type": "stats",
+            "source": self.name,
+            "fps": round(fps, 2),
+            "stride": self.stride,
+            "frames": self.frames,
+            "behind": behind,
+        }
+
+    def _incident(self, event, incident):
+        return {"type": "incident", "event": event, "source": self.name,
+                **incident.to_dict(self.thresholds.get()["labels"])}
+
+    def close(self):
+        if not self.finished:
+            incident = self.incidents.close()
+            if incident is not None:
+                self.events.append(self._incident("end", incident))
+        self.finished = True
+        self.cap.release()
+
+
+# =========================
+# WORKER PROCESS
+# =========================
+def run_worker(sources, sink, stride=1, realtime=None, report_every=REPORT_EVERY):
+    """Round-robins over its share of sources, one frame per stream per turn"""
+    watcher = ConfigWatcher()
+    streams = [Stream(s, watcher, stride, realtime) for s in sources]
+    for stream in streams:
+        if stream.finished:
+            sink.put({"type": "error", "source": stream.name, "message": "Unable to read video source"})
+
+    last_report = time.time()
+    while any(not s.finished for s in streams):
+        for stream in streams:
+            if stream.finished:
+                continue
+            result = stream.step()
+            if result is not None:
+                sink.put(result)
+            for event in stream.events:
+                sink.put(event)
+            stream.events = []
+
+        if time.time() - last_report >= report_every:
+            for stream in streams:
+                if not stream.finished:
+                    sink.put(stream.report())
+            last_report = time.time()
+
+    for stream in streams:
+        sink.put({"type": "done", "source": stream.name, "frames": stream.frames})
+
+
+# =========================
+# POOL
+# =========================
+def split_sources(sources, workers):
+    """Deals sources out to workers like cards so load stays even"""
+    return [sources[i::workers] for i in range(workers) if sources[i::workers]]
+
+
+def run(sources, workers=None, out=None, stride=None, realtime=None, report_every=REPORT_EVERY):
+    """
+    Runs every source on a process pool sized to the available cores and
+    drains all results through one sink. Frame results go to `out` as JSON
+    lines (stdout when None); stats and errors are printed.
+    """
+    sources = [parse_source(s) for s in sources]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+    if stride is None:
+        stride = load_sampling()["stride"]
+
+    sink = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=run_worker, args=(share, sink, stride, realtime, report_every))
+        for share in split_sources(sources, workers)
+    ]
+    for p in procs:
+        p.start()
+
+    out_file = open(out, "a") if out else sys.stdout
+    pending = len(sources)
+    try:
+        while pending:
+            try:
+                item = sink.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in procs):
+                    break
+                continue
+
+            if item["type"] == "frame":
+                out_file.write(json.dumps(item) + "\n")
+            elif item["type"] == "incident":
+                out_file.write(json.dumps(item) + "\n")
+                print(f"🚨 {item['source']} | Incident #{item['incident']} {item['event'].upper()} | "
+                      f"{item['peak_risk']} | Duration={item['duration_s']:.1f}s", file=sys.stderr)
+            elif item["type"] == "stats":
+                flag = " | BEHIND, stride raised" if item["behind"] else ""
+                print(f"📈 {item['source']} | FPS={item['fps']:.2f} | Stride={item['stride']} | Frames={item['frames']}{flag}",
+                      file=sys.stderr)
+            elif item["type"] == "error":
+                print(f"❌ {item['source']} | {item['message']}", file=sys.stderr)
+            elif item["type"] == "done":
+                pending -= 1
+                print(f"✅ {item['source']} finished | Frames={item['frames']}", file=sys.stderr)
+    finally:
+        if out:
+            out_file.close()
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-camera crowd risk runner")
+    parser.add_argument("sources", nargs="+", help="Video files, stream URLs or device indices")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU cores)")
+    parser.add_argument("--out", default=None, help="JSONL file for per-frame results (default: stdout)")
+    parser.add_argument("--stride", type=int, default=None, help="Starting frame stride (default: thresholds.json)")
+    parser.add_argument("--realtime", action="store_true", help="Treat files as live feeds for back-off")
+    parser.add_argument("--report-every", type=float, default=REPORT_EVERY, help="Seconds between FPS reports")
+    args = parser.parse_args()
+
+    run(args.sources, args.workers, args.out, args.stride,
+        True if args.realtime else None, args.report_every)
@@ -0,0 +1,742 @@
+import argparse
+import asyncio
+import base64
+import collections
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import cv2
+import numpy as np
+
+from alert_log import load_alert_log_settings, shared_alert_log
+from capture import ThreadedCapture, load_capture_settings, open_capture, preview_frame
+from config import THRESHOLDS_FILE, load_config, merged_section
+from incidents import IncidentTracker, load_incident_settings
+from motion_engine import MotionEngine, load_engine_settings, load_sampling, frame_stride
+from result_cache import iter_cached_metrics
+from risk import LiveThresholds, apply_density, apply_trend, classify_level, classify_zones, level_for_label
+from runner import is_live, parse_source
+from telemetry import load_telemetry_settings, shared_telemetry, start_profile, stop_profile
+from trends import MotionTrends, load_trend_windows
+
+# =========================
+# ANALYSIS SERVICE
+# =========================
+# Runs every source once, however many dashboards watch it, and fans the
+# results out over a local HTTP server as Server-Sent Events:
+#
+#   POST /sources          {"source", "camera", "video_hash", "stride"} -> {"id"}
+#   GET  /events/<id>      event stream: frame, incident, preview, end
+#   GET  /snapshot/<id>    latest frame event as JSON
+#   GET  /preview/<id>.jpg latest preview JPEG
+#   GET  /sources, /health
+#
+# Opening a source that is already running joins it. Each event is
+# encoded once and the same bytes go to every subscriber; previews are
+# only drawn while someone is watching. A slow viewer drops its oldest
+# queued events instead of holding up the analysis or other viewers.
+# Live sources stop idle_timeout seconds after their last viewer leaves;
+# files run to the end (filling the result cache) and their final state
+# is kept for keep_finished seconds for late joiners.
+DEFAULT_SETTINGS = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "queue": 256,
+    "history": 50,
+    "heartbeat": 1.0,
+    "idle_timeout": 30,
+    "keep_finished": 600,
+}
+
+UI_DEFAULTS = {"fps": 5, "preview_width": 640, "jpeg_quality": 70}
+
+
+def load_service_settings(path=THRESHOLDS_FILE):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(merged_section(load_config(path), "service"))
+    return settings
+
+
+def load_ui_settings(path=THRESHOLDS_FILE, camera=None):
+    """Preview rate / size ("ui" section): the service draws, the page shows"""
+    settings = dict(UI_DEFAULTS)
+    settings.update(merged_section(load_config(path), "ui", camera))
+    return settings
+
+
+# =========================
+# RISK DETAILS
+# =========================
+RISK_DETAILS = {
+    "very_low": (0.95, "Crowd is calm, safe movement."),
+    "normal": (0.85, "Crowd is moving normally."),
+    "elevated": (0.70, "Crowd is getting dense, monitor carefully."),
+    "high": (0.60, "Crowd is moving fast, prepare staff."),
+    "critical": (0.90, "Crowd movement is dangerous, act immediately!"),
+}
+SPIKE_DETAILS = (0.99, "Sudden rush detected! High risk of panic or stampede.")
+TREND_DETAILS = (0.75, "Crowd motion rising steadily, possible build-up to a stampede.")
+DENSITY_DETAILS = (0.70, "Crowd is packed densely; crushing is possible even without fast movement.")
+
+ACTIONS = {
+    "critical": "IMMEDIATE ACTION: Open exits, stop inflow, alert authorities",
+    "high": "PREVENTIVE ACTION: Control entry, deploy staff",
+    "elevated": "MONITOR: Crowd density rising",
+}
+ALERT_LEVELS = ["high", "critical"]
+
+
+def source_id(source, camera=None, video_hash=None, stride=1):
+    """
+    Name a source is shared under: the device index or stream URL itself
+    for live feeds (one capture per device, whatever camera name or
+    stride viewers ask for), the content hash plus stride for files.
+    The camera name only selects the per-camera config.
+    """
+    source = parse_source(source)
+    if is_live(source):
+        return str(source)
+    name = video_hash[:16] if video_hash else (camera or os.path.basename(str(source)))
+    return name if stride == 1 else f"{name}@{stride}"
+
+
+def sse(event, data):
+    """One Server-Sent Event, encoded once for every subscriber"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def encode_preview(frame, snap, ui):
+    """Downscaled JPEG of a BGR frame with the risk overlay, or None"""
+    h, w = frame.shape[:2]
+    if w > ui["preview_width"]:
+        size = (ui["preview_width"], int(h * ui["preview_width"] / w))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    else:
+        frame = frame.copy()
+    cv2.putText(frame, f"Risk: {snap['risk']} ({snap['confidence']:.2f})", (20, 40),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+    cv2.putText(frame, f"Active Zone: {snap['active_zone']}", (20, 80),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(frame, f"Spike: {'YES' if snap['spike'] else 'NO'}", (20, 120),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(ui["jpeg_quality"])])
+    return jpeg.tobytes() if ok else None
+
+
+# =========================
+# CHANNEL
+# =========================
+class Channel:
+    """
+    Latest state of one source and its subscribers' queues. Lives on
+    the event loop; analysis threads reach it via call_soon_threadsafe.
+    """
+
+    def __init__(self, name, queue_size=256, history=50):
+        self.name = name
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.history = collections.deque(maxlen=history)
+        self.snapshot = None
+        self.frame = None
+        self.preview = None
+        self.preview_message = None
+        self.end = None
+        self.ended = None
+        self.idle_since = time.time()
+        self.dropped = 0
+
+    def publish(self, event, data, message):
+        if event == "frame":
+            self.snapshot, self.frame = data, message
+        elif event == "preview":
+            self.preview, self.preview_message = data, message
+        elif event == "end":
+            self.end, self.ended = message, time.time()
+        else:
+            self.history.append(message)
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+
+    def subscribe(self):
+        """Queue primed with recent incidents and the latest frame / preview"""
+        queue = asyncio.Queue(self.queue_size)
+        for message in list(self.history) + [self.frame, self.preview_message, self.end]:
+            if message is not None and not queue.full():
+                queue.put_nowait(message)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.idle_since = time.time()
+
+
+# =========================
+# ONE SOURCE
+# =========================
+class SourceAnalysis:
+    """
+    The dashboard's analysis loop for one source, on its own thread.
+    publish(event, data) hands results to the source's Channel.
+    """
+
+    def __init__(self, name, source, publish, viewers, camera=None, video_hash=None, stride=1, keep=False):
+        self.name = name
+        self.source = source
+        self.camera = camera or str(source)
+        self.video_hash = video_hash
+        self.stride = max(1, int(stride))
+        self.live = is_live(source)
+        self.keep = keep
+        self.publish = publish
+        self.viewers = viewers
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def open(self, engine_settings):
+        capture_settings = load_capture_settings(camera=self.camera)
+        if isinstance(self.source, int):
+            # Live device: decode on a background thread, analyse the freshest frame
+            return ThreadedCapture(self.source, luma=capture_settings["luma"],
+                                   max_width=engine_settings["process_width"],
+                                   luma_range=capture_settings["luma_range"])
+        return open_capture(self.source, capture_settings, engine_settings["process_width"])
+
+    def run(self):
+        """
+        analyse() with the guarantees subscribers rely on: the capture is
+        released and an "end" event is published however the run ends
+        (with error set when it failed)
+        """
+        cap = None
+        summary = {"error": None}
+        try:
+            engine_settings = load_engine_settings(camera=self.camera)
+            cap = self.open(engine_settings)
+            summary = self.analyse(cap, engine_settings)
+        except Exception as e:
+            summary = {"error": f"Analysis failed: {type(e).__name__}: {e}"}
+            print(f"❌ {self.name} | {summary['error']}")
+        finally:
+            if cap is not None:
+                cap.release()
+            self.publish("end", summary)
+
+    def analyse(self, cap, engine_settings):
+        """The analysis loop; returns the summary carried by the "end" event"""
+        camera_id = self.camera
+        alert_log = shared_alert_log(load_alert_log_settings())
+        ui = load_ui_settings(camera=camera_id)
+        sampling = load_sampling()
+        ret, prev_frame = cap.read()
+        if not ret:
+            return {"error": "Unable to read video source"}
+
+        alert_log.system("SYSTEM STARTED | Crowd analysis running", camera=camera_id)
+
+        # Stage timers + /metrics endpoint and cProfile, per the "telemetry"
+        # section of thresholds.json (all off by default)
+        telemetry_settings = load_telemetry_settings(camera=camera_id)
+        telemetry = shared_telemetry(telemetry_settings)
+        profiler = start_profile(telemetry_settings["profile"])
+
+        engine = MotionEngine(**engine_settings, telemetry=telemetry)
+        engine.process(prev_frame)
+        thresholds = LiveThresholds(camera_id)
+
+        # Per-frame risk -> debounced incidents; alerts are raised per incident
+        incidents = IncidentTracker(camera_id, **load_incident_settings(camera=camera_id))
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+        # Rolling windows (O(1) per frame): "smooth" for risk and spikes,
+        # "trend" slope for stampede prediction, "baseline" for context.
+        # Fed with footage time, so frames a live capture drops under load
+        # do not stretch the windows or the slope
+        trend_windows = load_trend_windows(camera=camera_id)
+        analysis_fps = source_fps / frame_stride(cap, self.stride, sampling["target_fps"])
+        trends = MotionTrends(trend_windows, analysis_fps)
+
+        state = {
+            "frames": 0, "spikes": 0, "alerts": 0, "incidents": 0, "low_risk": 0,
+            "confidence_total": 0.0, "latency_total": 0.0, "latency_max": 0.0,
+            "smooth_motion": 0.0, "density": 0.0, "risk": "", "confidence": 0.0, "spike": False,
+            "active_zone": "", "elapsed": 0.0,
+        }
+        preview_every = 1.0 / max(0.1, float(ui["fps"]))
+        next_preview = 0.0
+        preview_seq = 0
+        if self.viewers():
+            jpeg = encode_preview(preview_frame(cap, prev_frame), state, ui)
+            if jpeg is not None:
+                preview_seq += 1
+                self.publish("preview", {"seq": preview_seq, "jpeg": base64.b64encode(jpeg).decode()})
+
+        prev_motion = 0.0
+        zone_trends = None
+        start_time = time.time()
+        loop_mark = time.perf_counter()
+        current = thresholds.get()
+
+        # =========================
+        # MAIN LOOP
+        # =========================
+        # A video analysed before with the same engine settings replays
+        # its cached metrics (frame is None then; see result_cache.py)
+        for frame, metrics in iter_cached_metrics(cap, engine, self.stride, sampling["target_fps"],
+                                                  self.video_hash, engine_settings):
+            if self.stop_event.is_set():
+                break
+            avg_motion = metrics.avg_motion
+
+            # ---------- Smooth motion + trend ----------
+            footage_time = metrics.frame_number / source_fps
+            trends.push(avg_motion, footage_time)
+            smooth_motion = trends.mean("smooth")
+            slope = trends.slope_per_second("trend")
+            if zone_trends is None:
+                zone_names = list(metrics.zones)
+                zone_trends = MotionTrends({"trend": trend_windows["trend"]}, analysis_fps, width=len(zone_names))
+            zone_trends.push(np.fromiter(metrics.zones.values(), dtype=np.float64, count=len(zone_names)), footage_time)
+
+            # ---------- Thresholds (hot reload) ----------
+            if thresholds.poll():
+                alert_log.system(f"THRESHOLDS RELOADED | Camera={camera_id}", camera=camera_id)
+            current = thresholds.get()
+
+            # ---------- Spike Detection + Risk Classification ----------
+            spike = smooth_motion - prev_motion
+            level, spike_detected = classify_level(smooth_motion, spike, current)
+            level, trend_detected = apply_trend(level, slope, current)
+            level, dense = apply_density(level, metrics.density, current)
+            spike_explanation = "No sudden spike." if not spike_detected else "Sudden rush detected! High risk of panic or stampede."
+
+            # ---------- Zone Analysis ----------
+            active_zone = metrics.active_zone
+            zone_risks = classify_zones(metrics, thresholds)
+            risky_zones = [z for z, r in zone_risks.items() if level_for_label(r, current) in ALERT_LEVELS]
+            zone_slopes = zone_trends.slope_per_second("trend")
+            rising_zones = [z for z, s in zip(zone_names, zone_slopes) if s > current["trend_slope"]]
+
+            # ---------- Risk Details ----------
+            risk = current["labels"][level]
+            if spike_detected:
+                confidence, explanation = SPIKE_DETAILS
+            elif trend_detected:
+                confidence, explanation = TREND_DETAILS
+            elif dense:
+                confidence, explanation = DENSITY_DETAILS
+            else:
+                confidence, explanation = RISK_DETAILS[level]
+
+            # ---------- Action ----------
+            action = ACTIONS.get(level, "SAFE")
+            if telemetry:
+                telemetry.lap("classification")
+
+            # ---------- Latency (capture -> risk decision) ----------
+            frame_time = getattr(cap, "frame_time", None)
+            latency = time.time() - frame_time if frame_time is not None else 0.0
+
+            # ---------- Incidents ----------
+            # Footage time for files, capture time for live feeds
+            new_incidents = 0
+            when = frame_time if frame_time is not None else start_time + metrics.frame_number / source_fps
+            for event, incident in incidents.update(level, float(smooth_motion), when, metrics.frame_number,
+                                                    risky_zones, spike_detected):
+                record = incident.to_dict(current["labels"])
+                alert_log.incident(event, record)
+                if event == "start":
+                    new_incidents += 1
+                if event == "end":
+                    kind, message = "info", (f"✅ Incident #{incident.id} over | Peak: {record['peak_risk']} | "
+                                             f"Duration: {record['duration_s']:.1f}s | Zones: {', '.join(record['zones']) or '-'}")
+                else:
+                    kind, message = "warning", (f"🚨 Incident #{incident.id} {event.upper()} | {record['peak_risk']} | "
+                                                f"{active_zone} | Motion={smooth_motion:.2f} | {action}")
+                self.publish("incident", {"event": event, "incident": record, "kind": kind, "message": message})
+
+            # ---------- Logging ----------
+            # Calm frames are sampled; HIGH RISK / CRITICAL ones are written at once
+            is_alert = level in ALERT_LEVELS
+            alert_log.frame(
+                "WARNING" if is_alert else "INFO",
+                camera=camera_id, frame=metrics.frame_number, risk=risk, zone=active_zone,
+                motion=round(float(smooth_motion), 4), spike=bool(spike_detected),
+                confidence=confidence, action=action, explanation=explanation,
+                spike_info=spike_explanation, risky_zones=risky_zones,
+                trend=round(float(slope), 4), baseline=round(float(trends.mean("baseline")), 4),
+                rising_zones=rising_zones, density=round(float(metrics.density), 4),
+            )
+            if telemetry:
+                telemetry.lap("logging")
+
+            # ---------- Frame event ----------
+            state["frames"] += 1
+            state["spikes"] += int(spike_detected)
+            state["alerts"] += int(is_alert)
+            state["low_risk"] += int(not is_alert)
+            state["incidents"] += new_incidents
+            state["confidence_total"] += confidence
+            state["latency_total"] += latency
+            state["latency_max"] = max(state["latency_max"], latency)
+            state.update(smooth_motion=float(smooth_motion), density=float(metrics.density), risk=risk,
+                         confidence=confidence, spike=bool(spike_detected), active_zone=active_zone,
+                         elapsed=time.time() - start_time)
+            self.publish("frame", dict(state, frame_number=metrics.frame_number, level=level,
+                                       zones=metrics.zones, zone_risks=zone_risks))
+
+            # ---------- Preview ----------
+            # Drawn and encoded once for all viewers, only while there are
+            # any (luma captures build the colour frame here too)
+            if frame is not None and self.viewers() and time.perf_counter() >= next_preview:
+                jpeg = encode_preview(preview_frame(cap, frame), state, ui)
+                if jpeg is not None:
+                    preview_seq += 1
+                    self.publish("preview", {"seq": preview_seq, "jpeg": base64.b64encode(jpeg).decode()})
+                next_preview = time.perf_counter() + preview_every
+
+            # ---------- Telemetry ----------
+            if telemetry:
+                now = time.perf_counter()
+                telemetry.observe("frame_seconds", latency if frame_time is not None else now - loop_mark)
+                telemetry.inc("frames_total", camera=camera_id)
+                if is_alert:
+                    telemetry.event("alerts")
+                telemetry.set("open_incidents", int(incidents.active is not None), camera=camera_id)
+                telemetry.set("dropped_frames", getattr(cap, "dropped", 0), camera=camera_id)
+                telemetry.set("queue_depth", len(getattr(cap, "buffer", ())), camera=camera_id)
+                loop_mark = now
+
+            prev_motion = smooth_motion
+
+        stop_profile(profiler, telemetry_settings["profile"])
+        last_incident = incidents.close()
+        if last_incident is not None:
+            record = last_incident.to_dict(current["labels"])
+            alert_log.incident("end", record)
+            self.publish("incident", {"event": "end", "incident": record, "kind": "info",
+                                      "message": f"✅ Incident #{last_incident.id} over | Peak: {record['peak_risk']}"})
+
+        frame_count = state["frames"]
+        state["elapsed"] = time.time() - start_time
+        fps = frame_count / state["elapsed"] if state["elapsed"] > 0 else 0.0
+        avg_confidence = state["confidence_total"] / frame_count if frame_count else 0.0
+        avg_latency = state["latency_total"] / frame_count if frame_count else 0.0
+        dropped_frames = getattr(cap, "dropped", 0)
+
+        alert_log.system(
+            f"SYSTEM STOPPED | Frames={frame_count} | Alerts={state['alerts']} | Incidents={state['incidents']} | "
+            f"LowRiskFrames={state['low_risk']} | AvgConfidence={avg_confidence:.2f} | FPS={fps:.2f} | "
+            f"DroppedFrames={dropped_frames} | AvgLatency={avg_latency * 1000:.0f}ms | "
+            f"MaxLatency={state['latency_max'] * 1000:.0f}ms",
+            camera=camera_id, frames=frame_count, alerts=state["alerts"], incidents=state["incidents"],
+            fps=round(fps, 2), dropped_frames=dropped_frames, log_records_dropped=alert_log.dropped,
+        )
+        alert_log.flush()
+        return dict(state, fps=fps, dropped_frames=dropped_frames, stopped=self.stop_event.is_set(), error=None)
+
+
+# =========================
+# HTTP SERVER
+# =========================
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def http_response(status, body=b"", content_type="application/json"):
+    head = (f"HTTP/1.1 {status} {STATUS[status]}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+    return head.encode() + body
+
+
+def json_response(data, status=200):
+    return http_response(status, json.dumps(data).encode())
+
+
+async def read_request(reader):
+    """(method, path, body) of one HTTP/1.1 request, or None"""
+    line = await reader.readline()
+    parts = line.decode("latin-1").split()
+    if len(parts) < 2:
+        return None
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = header.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length") or 0))
+    return parts[0].upper(), urllib.parse.unquote(parts[1].split("?")[0]), body
+
+
+class AnalysisService:
+    """
+    Sources, their channels and the HTTP front end, all on one asyncio
+    loop. serve() runs it in the foreground (python service.py),
+    start() on a daemon thread (shared_service()).
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or load_service_settings()
+        self.channels = {}
+        self.analyses = {}
+        self.loop = None
+        self.server = None
+        self.ready = threading.Event()
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    # ---------- Sources ----------
+    def open(self, source, camera=None, video_hash=None, stride=1, keep=False):
+        """Starts a source, or joins it when it is already running. Returns its id."""
+        source = parse_source(source)
+        stride = max(1, int(stride or 1))
+        name = source_id(source, camera, video_hash, stride)
+        running = self.analyses.get(name)
+        if running is not None and running.is_alive() and not running.stop_event.is_set():
+            running.keep = running.keep or keep
+            return name
+
+        channel = Channel(name, self.settings["queue"], self.settings["history"])
+        self.channels[name] = channel
+
+        def publish(event, data):
+            message = sse(event, data)
+            try:
+                self.loop.call_soon_threadsafe(channel.publish, event, data, message)
+            except RuntimeError:
+                pass    # loop closed while shutting down
+
+        self.analyses[name] = SourceAnalysis(name, source, publish, lambda: len(channel.subscribers),
+                                             camera, video_hash, stride, keep).start()
+        print(f"🎥 {name} | analysis started ({camera or source})")
+        return name
+
+    def describe(self):
+        return [{
+            "id": name, "camera": analysis.camera, "source": str(analysis.source),
+            "running": analysis.is_alive(), "viewers": len(self.channels[name].subscribers),
+            "frames": (self.channels[name].snapshot or {}).get("frames", 0),
+            "dropped_events": self.channels[name].dropped,
+        } for name, analysis in self.analyses.items()]
+
+    async def reap(self):
+        """Stops unwatched live sources and forgets long-finished ones"""
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.time()
+            for name, channel in list(self.channels.items()):
+                analysis = self.analyses[name]
+                if channel.ended is not None:
+                    if not channel.subscribers and now - channel.ended > self.settings["keep_finished"]:
+                        del self.channels[name], self.analyses[name]
+                elif (analysis.live and not analysis.keep and not channel.subscribers
+                      and now - channel.idle_since > self.settings["idle_timeout"]):
+                    if not analysis.stop_event.is_set():
+                        print(f"💤 {name} | no viewers for {self.settings['idle_timeout']}s, stopping")
+                    analysis.stop()
+
+    # ---------- HTTP ----------
+    async def handle(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is None:
+                return
+            method, path, body = request
+            parts = path.strip("/").split("/", 1)
+            name = parts[1] if len(parts) > 1 else None
+            preview = None
+            if name and name.endswith(".jpg") and name[:-4] in self.channels:
+                preview = self.channels[name[:-4]].preview
+
+            if path == "/health":
+                writer.write(json_response({"ok": True, "sources": len(self.analyses)}))
+            elif path == "/sources" and method == "POST":
+                try:
+                    spec = json.loads(body or b"{}")
+                    writer.write(json_response({"id": self.open(**spec)}))
+                except (TypeError, ValueError, KeyError) as e:
+                    writer.write(json_response({"error": str(e)}, 400))
+            elif path == "/sources":
+                writer.write(json_response(self.describe()))
+            elif parts[0] == "events" and name in self.channels:
+                await self.stream(self.channels[name], writer)
+            elif parts[0] == "snapshot" and name in self.channels:
+                writer.write(json_response(self.channels[name].snapshot or {}))
+            elif parts[0] == "preview" and preview is not None:
+                writer.write(http_response(200, base64.b64decode(preview["jpeg"]), "image/jpeg"))
+            else:
+                writer.write(json_response({"error": f"Unknown source or path: {path}"}, 404))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, channel, writer):
+        """Event stream until the source ends or the viewer goes away"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        queue = channel.subscribe()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.settings["heartbeat"])
+                except asyncio.TimeoutError:
+                    message = b": ping\n\n"     # lets both ends notice a dead peer
+                writer.write(message)
+                await writer.drain()
+                if message.startswith(b"event: end"):
+                    break
+        finally:
+            channel.unsubscribe(queue)
+
+    async def serve(self, sources=(), stride=1):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle, self.settings["host"], self.settings["port"])
+        for source in sources:
+            self.open(source, str(source), stride=stride, keep=True)
+        print(f"📡 Analysis service on {self.url} (events at /events/<id>)")
+        self.ready.set()
+        async with self.server:
+            await self.reap()
+
+    def start(self):
+        """Runs the service on a daemon thread; returns once it is listening"""
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.serve())
+            except OSError as e:
+                errors.append(e)
+                self.ready.set()
+
+        threading.Thread(target=run, daemon=True).start()
+        self.ready.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+
+# =========================
+# CLIENT
+# =========================
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def service_url(settings=None):
+    settings = settings or load_service_settings()
+    return f"http://{settings['host']}:{settings['port']}"
+
+
+def request_json(url, payload=None, timeout=5.0):
+    data = None if payload is None else json.dumps(payload).encode()
+    request = urllib.request.Request(url, data, {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def ping(url, timeout=0.5):
+    try:
+        return bool(request_json(f"{url}/health", timeout=timeout).get("ok"))
+    except (OSError, ValueError):
+        return False
+
+
+def shared_service(settings=None):
+    """
+    URL of the analysis service: a running `python service.py` when one
+    answers at host:port, else one started inside this process (shared
+    by every Streamlit session it serves).
+    """
+    settings = settings or load_service_settings()
+    url = service_url(settings)
+    with _shared_lock:
+        key = (settings["host"], settings["port"])
+        if key in _shared:
+            return _shared[key].url
+        if ping(url):
+            return url
+        _shared[key] = AnalysisService(settings).start()
+        return _shared[key].url
+
+
+def running_sources(url, timeout=0.5):
+    """Sources (as passed to open_source) the service at url is analysing; empty when none answers"""
+    try:
+        return {s["source"] for s in request_json(f"{url}/sources", timeout=timeout) if s["running"]}
+    except (OSError, ValueError):
+        return set()
+
+
+def open_source(url, source, camera=None, video_hash=None, stride=1):
+    """Asks the service to analyse a source (or join it); returns the source id"""
+    spec = {"source": source, "camera": camera, "video_hash": video_hash, "stride": int(stride)}
+    return request_json(f"{url}/sources", spec)["id"]
+
+
+def subscribe(url, name, stop=None, timeout=30.0):
+    """
+    Yields (event, data) from a source's event stream until it ends,
+    the connection drops or stop is set (checked on every line; the
+    service sends a heartbeat each second).
+    """
+    stream_url = f"{url}/events/{urllib.parse.quote(name, safe='')}"
+    with urllib.request.urlopen(stream_url, timeout=timeout) as response:
+        event, data = None, []
+        for raw in response:
+            if stop is not None and stop.is_set():
+                return
+            line = raw.decode().rstrip("\r\n")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif not line and event:
+                yield event, json.loads("\n".join(data))
+                if event == "end":
+                    return
+                event, data = None, []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared crowd analysis service for dashboards")
+    parser.add_argument("sources", nargs="*", help="Video files, stream URLs or device indices to run from the start")
+    parser.add_argument("--host", default=None, help="Listen address (default: thresholds.json service.host)")
+    parser.add_argument("--port", type=int, default=None, help="Listen port (default: thresholds.json service.port)")
+    parser.add_argument("--stride", type=int, default=1, help="Frame stride for the sources above")
+    args = parser.parse_args()
+
+    settings = load_service_settings()
+    if args.host:
+        settings["host"] = args.host
+    if args.port is not None:
+        settings["port"] = args.port
+    try:
+        asyncio.run(AnalysisService(settings).serve(args.sources, args.stride))
+    except KeyboardInterrupt:
+        pass
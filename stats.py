@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+# =========================
+# HISTOGRAM LAYOUT
+# =========================
+# Fixed bins shared by every accumulator so any two can be merged.
+# Motion is in reference pixels per frame; 0.01 resolution up to 64
+# covers everything a crowd produces. Larger values land in the last
+# bin (the exact maximum is tracked separately).
+BIN_WIDTH = 0.01
+MAX_VALUE = 64.0
+NUM_BINS = int(MAX_VALUE / BIN_WIDTH)
+
+
+class StreamingStats:
+    """
+    Constant-memory running statistics: count, min, max, Welford
+    mean/variance and a fixed-bin histogram for median, MAD and
+    percentiles. Accumulators from different videos or worker
+    processes combine with merge().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.hist = np.zeros(NUM_BINS, dtype=np.int64)
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.hist[self._bin(value)] += 1
+
+    def merge(self, other):
+        """Chan et al. parallel combination of two accumulators"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+        else:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self.m2 += other.m2 + delta * delta * self.count * other.count / total
+            self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.hist += other.hist
+        return self
+
+    @staticmethod
+    def _bin(value):
+        return min(NUM_BINS - 1, max(0, int(value / BIN_WIDTH)))
+
+    # ---------- Summary values ----------
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100), accurate to one bin"""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        idx = int(np.searchsorted(np.cumsum(self.hist), rank, side="left"))
+        idx = min(idx, NUM_BINS - 1)
+        value = (idx + 0.5) * BIN_WIDTH
+        return min(max(value, self.min), self.max)
+
+    @property
+    def median(self):
+        return self.percentile(50)
+
+    @property
+    def mad(self):
+        """Median absolute deviation, from the histogram"""
+        if self.count == 0:
+            return 0.0
+        centres = (np.arange(NUM_BINS) + 0.5) * BIN_WIDTH
+        deviations = np.abs(centres - self.median)
+        order = np.argsort(deviations, kind="stable")
+        cumulative = np.cumsum(self.hist[order])
+        idx = int(np.searchsorted(cumulative, 0.5 * self.count, side="left"))
+        return float(deviations[order[min(idx, NUM_BINS - 1)]])
+
+    def summary(self):
+        return {
+            "frames": self.count,
+            "min": self.min if self.count else 0.0,
+            "median": self.median,
+            "mad": self.mad,
+            "mean": self.mean,
+            "std": self.std,
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else 0.0,
+        }
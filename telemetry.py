@@ -0,0 +1,295 @@
+import bisect
+import cProfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import THRESHOLDS_FILE, merged_section, load_config
+
+# =========================
+# TELEMETRY SETTINGS
+# =========================
+# "telemetry" section of thresholds.json. Off by default; when off every
+# hook is a no-op on a falsy NULL_TELEMETRY, so the loops pay one
+# truth test per stage.
+PREFIX = "crowd_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RATE_WINDOW = 10.0      # seconds behind the *_per_second gauges
+
+HELP = {
+    "stage_seconds": "Wall time per pipeline stage",
+    "frame_seconds": "Capture to risk decision per analysed frame",
+    "render_seconds": "Dashboard redraw from the latest snapshot (UI thread)",
+    "frames_total": "Analysed frames",
+    "gated_frames_total": "Frames the motion gate answered without optical flow",
+    "alerts_total": "High / critical frames",
+    "alerts_per_second": f"Alerts over the last {RATE_WINDOW:g}s",
+    "dropped_frames": "Frames the capture thread discarded",
+    "queue_depth": "Frames (or chunks) waiting to be analysed",
+}
+
+
+def load_telemetry_settings(path=THRESHOLDS_FILE, camera=None):
+    settings = {"enabled": False, "host": "127.0.0.1", "port": 9108, "profile": None}
+    settings.update(merged_section(load_config(path), "telemetry", camera))
+    return settings
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _labels(label_items, extra=()):
+    items = list(label_items) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+# =========================
+# REGISTRY
+# =========================
+class Telemetry:
+    """
+    Counters, gauges and fixed-bucket histograms rendered in the
+    Prometheus text format. Several analysis threads may share one
+    registry (service.py runs one per source), so updates take a lock;
+    render() copies before formatting so the HTTP thread never blocks
+    the writers for long.
+
+    lap(stage) charges the time since the calling thread's previous lap
+    (or start()) to stage_seconds{stage=...}, so a loop only marks where
+    stages end. The lap mark is per thread: one stream's time is never
+    charged to another stream's stages.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, rate_window=RATE_WINDOW):
+        self.buckets = tuple(buckets)
+        self.rate_window = rate_window
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.events = {}
+        self.stage_keys = {}
+        self.marks = threading.local()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def __bool__(self):
+        return True
+
+    # ---------- timers ----------
+    def start(self):
+        self.marks.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        last = getattr(self.marks, "last", now)
+        key = self.stage_keys.get(stage)
+        if key is None:
+            key = self.stage_keys[stage] = _key("stage_seconds", {"stage": stage})
+        self._observe(key, now - last)
+        self.marks.last = now
+
+    # ---------- metrics ----------
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        self._observe(_key(name, labels), value)
+
+    def _observe(self, key, value):
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            hist[bisect.bisect_left(self.buckets, value)] += 1
+            hist[-1] += value
+
+    def event(self, name):
+        """Counts name_total and feeds the name_per_second gauge"""
+        self.inc(f"{name}_total")
+        with self.lock:
+            self.events.setdefault(name, deque()).append(time.time())
+
+    # ---------- export ----------
+    def snapshot(self):
+        """Picklable copy, e.g. to ship from a worker process to merge()"""
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {k: list(v) for k, v in self.histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        """Adds a snapshot's counters and histograms; its gauges replace ours"""
+        with self.lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(snapshot["gauges"])
+            for key, hist in snapshot["histograms"].items():
+                mine = self.histograms.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(hist):
+                    mine[i] += value
+
+    def rates(self):
+        now = time.time()
+        rates = {}
+        with self.lock:
+            for name, times in self.events.items():
+                while times and now - times[0] > self.rate_window:
+                    times.popleft()
+                rates[f"{name}_per_second"] = len(times) / self.rate_window
+        return rates
+
+    def render(self):
+        snap = self.snapshot()
+        lines = []
+
+        def header(name, kind):
+            if name in HELP:
+                lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        seen = set()
+        for (name, labels), value in sorted(snap["counters"].items()):
+            if name not in seen:
+                header(name, "counter")
+                seen.add(name)
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+
+        gauges = dict(snap["gauges"])
+        gauges.update({_key(name, {}): value for name, value in self.rates().items()})
+        for (name, labels), value in sorted(gauges.items()):
+            if name not in seen:
+                header(name, "gauge")
+                seen.add(name)
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+
+        for (name, labels), hist in sorted(snap["histograms"].items()):
+            if name not in seen:
+                header(name, "histogram")
+                seen.add(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), hist[:-1]):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {hist[-1]:.6f}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """{stage: mean ms} for console reports"""
+        out = {}
+        for (name, labels), hist in self.snapshot()["histograms"].items():
+            count = sum(hist[:-1])
+            if name == "stage_seconds" and count:
+                out[dict(labels)["stage"]] = hist[-1] / count * 1000
+        return out
+
+    # ---------- HTTP ----------
+    def serve(self, port=9108, host="127.0.0.1"):
+        """Serves GET /metrics on a daemon thread (once per registry)"""
+        if self.server is not None:
+            return self.server
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics on http://{host}:{self.server.server_port}/metrics")
+        return self.server
+
+
+class NullTelemetry(Telemetry):
+    """Disabled telemetry: falsy, and every hook does nothing"""
+
+    def __bool__(self):
+        return False
+
+    def start(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def event(self, name):
+        pass
+
+    def merge(self, snapshot):
+        pass
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        return None
+
+
+NULL_TELEMETRY = NullTelemetry()
+_shared = {}
+
+
+def shared_telemetry(settings=None):
+    """
+    One registry (and HTTP server) per process, so Streamlit reruns keep
+    counting into the same endpoint. NULL_TELEMETRY when disabled.
+    """
+    settings = settings or load_telemetry_settings()
+    if not settings.get("enabled"):
+        return NULL_TELEMETRY
+    key = (settings.get("host"), settings.get("port"))
+    if key not in _shared:
+        telemetry = Telemetry()
+        if settings.get("port"):
+            telemetry.serve(settings["port"], settings["host"])
+        _shared[key] = telemetry
+    return _shared[key]
+
+
+# =========================
+# PROFILER TOGGLE
+# =========================
+def start_profile(path):
+    """cProfile.Profile running until stop_profile(), or None when path is empty"""
+    if not path:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler, path):
+    if profiler is None:
+        return
+    profiler.disable()
+    profiler.dump_stats(path)
+    print(f"🧪 Profile written to {path} (view with: python -m pstats {path})")
@@ -0,0 +1,61 @@
+import json
+
+from alert_log import AlertLog, load_alert_log_settings
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def make_log(tmp_path, **settings):
+    return AlertLog(**dict(load_alert_log_settings(), path=str(tmp_path / "log.jsonl"), echo=False, **settings))
+
+
+def test_alert_frames_are_never_sampled(tmp_path):
+    log = make_log(tmp_path, info_sample_rate=0.1)
+    for frame in range(100):
+        log.frame("WARNING" if frame % 7 == 0 else "INFO", frame=frame)
+    log.flush()
+    log.close()
+
+    records = read_records(log.path)
+    warnings = [r["frame"] for r in records if r["level"] == "WARNING"]
+    infos = [r["frame"] for r in records if r["level"] == "INFO"]
+    assert warnings == list(range(0, 100, 7))
+    assert len(infos) == 9      # every 10th of the 85 INFO frames
+
+
+def test_always_overrides_sampling(tmp_path):
+    log = make_log(tmp_path, info_sample_rate=0.0)
+    log.frame("INFO", always=True, frame=1)
+    log.frame("INFO", frame=2)
+    log.frame("WARNING", always=False, frame=3)
+    log.flush()
+    log.close()
+    assert [r["frame"] for r in read_records(log.path)] == [1]
+
+
+def test_rotation_age_counts_from_the_existing_file(tmp_path):
+    path = tmp_path / "log.jsonl"
+    path.write_text(json.dumps({"ts": "2020-01-01T00:00:00.000", "level": "INFO", "event": "frame"}) + "\n")
+    log = make_log(tmp_path, rotate_every=3600)
+    log.system("restarted")
+    log.flush()
+    log.close()
+    assert (tmp_path / "log.jsonl.1").exists()
+    assert [r["message"] for r in read_records(path)] == ["restarted"]
+
+
+def test_recent_existing_file_is_appended_to(tmp_path):
+    path = tmp_path / "log.jsonl"
+    log = make_log(tmp_path, rotate_every=3600)
+    log.system("first run")
+    log.flush()
+    log.close()
+    log = make_log(tmp_path, rotate_every=3600)
+    log.system("second run")
+    log.flush()
+    log.close()
+    assert not (tmp_path / "log.jsonl.1").exists()
+    assert [r["message"] for r in read_records(path)] == ["first run", "second run"]
@@ -0,0 +1,23 @@
+import os
+
+from batch import output_stems
+
+
+def test_single_video_keeps_its_name(tmp_path):
+    assert output_stems([str(tmp_path / "data" / "crowd1.mp4")], "out") == [os.path.join("out", "crowd1")]
+
+
+def test_same_name_in_different_folders():
+    stems = output_stems(["archive/cam1/2024-01-01.mp4", "archive/cam2/2024-01-01.mp4"], "out")
+    assert stems == [os.path.join("out", "cam1", "2024-01-01"), os.path.join("out", "cam2", "2024-01-01")]
+
+
+def test_same_name_different_extension():
+    stems = output_stems(["data/panic.avi", "data/panic.mp4", "data/calm.mp4"], "out")
+    assert stems == [os.path.join("out", "panic.avi"), os.path.join("out", "panic.mp4"), os.path.join("out", "calm")]
+
+
+def test_stems_are_unique():
+    paths = ["a/x.mp4", "a/x.avi", "b/x.mp4", "a/b/x.mp4", "y.mp4"]
+    stems = output_stems(paths, "out")
+    assert len(set(stems)) == len(paths)
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from capture import LIMITED_TO_FULL, load_capture_settings, open_capture, range_table
+from detection import analyse_chunk
+
+
+def test_range_table_unknown_codec():
+    assert range_table("auto", -1) is None
+    assert range_table("auto", 0) is None
+    assert range_table("limited", -1) is LIMITED_TO_FULL
+
+
+@pytest.mark.parametrize("luma", [True, False])
+def test_open_capture_missing_path(tmp_path, luma):
+    settings = dict(load_capture_settings(), luma=luma)
+    cap = open_capture(str(tmp_path / "missing.mp4"), settings)
+    assert not cap.isOpened()
+    ret, _ = cap.read()
+    assert not ret
+    cap.release()
+
+
+def test_open_capture_corrupt_file(tmp_path):
+    path = tmp_path / "corrupt.mp4"
+    path.write_bytes(os.urandom(4096))
+    cap = open_capture(str(path))
+    ret, _ = cap.read()
+    assert not ret
+    cap.release()
+
+
+def test_calibration_chunk_of_missing_video(tmp_path):
+    path = str(tmp_path / "missing.mp4")
+    _, stats, changes, snapshot = analyse_chunk((path, 0, None))
+    assert stats.count == changes.count == 0
+    assert snapshot is None
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from detection import analyse_chunk, merge_chunks, split_chunks
+from synthetic import SCENARIOS, write_video
+
+FRAMES = 60
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    path = tmp_path_factory.mktemp("videos") / "panic.avi"
+    return write_video(str(path), 320, 180, FRAMES, seed=1, **SCENARIOS["panic"])
+
+
+def test_split_chunks_covers_video(video):
+    chunks = split_chunks(video, 25)
+    assert chunks == [(video, 0, 25), (video, 25, 50), (video, 50, FRAMES)]
+
+
+def test_chunked_calibration_matches_whole_file(video):
+    _, whole, whole_changes, _ = analyse_chunk((video, 0, None))
+    videos, changes = merge_chunks([analyse_chunk(chunk) for chunk in split_chunks(video, 25)])
+    chunked = videos[video]
+
+    # Every frame pair is analysed exactly once, boundaries included.
+    # Each chunk starts the flow backend cold (no warm-start flow), so
+    # the motion statistics agree closely rather than bit for bit
+    assert whole.count == chunked.count == FRAMES - 1
+    assert changes.count == whole_changes.count
+    assert chunked.mean == pytest.approx(whole.mean, rel=0.02)
+    assert chunked.max == pytest.approx(whole.max, rel=0.05)
+    assert chunked.median == pytest.approx(whole.median, rel=0.05)
+    assert changes.mean == pytest.approx(whole_changes.mean, rel=1e-6)
+
+
+def test_instrumented_chunk_returns_stage_timings(video):
+    _, stats, _, snapshot = analyse_chunk((video, 0, 20), instrument=True)
+    assert stats.count == 19
+    stages = {dict(labels)["stage"] for name, labels in snapshot["histograms"] if name == "stage_seconds"}
+    assert {"decode", "gray", "gate", "flow", "stats"} <= stages
+    assert np.isclose(snapshot["counters"][("frames_total", ())], 19)
@@ -0,0 +1,64 @@
+from incidents import IncidentTracker
+
+
+def feed(tracker, levels, start=0):
+    """Feeds one level per frame; returns [(frame, event, incident id)]"""
+    events = []
+    for frame, level in enumerate(levels, start=start):
+        for event, incident in tracker.update(level, 1.0, frame / 25.0, frame):
+            events.append((frame, event, incident.id))
+    return events
+
+
+def test_short_burst_does_not_open():
+    tracker = IncidentTracker(enter_frames=3, exit_frames=4)
+    assert feed(tracker, ["high", "high", "normal", "high", "critical", "normal"]) == []
+    assert tracker.active is None
+
+
+def test_opens_on_enter_streak_and_counts_it():
+    tracker = IncidentTracker(enter_frames=3, exit_frames=4)
+    assert feed(tracker, ["normal", "high", "high", "high"]) == [(3, "start", 1)]
+    incident = tracker.active
+    assert incident.start_frame == 1
+    assert incident.frames == 3
+
+
+def test_escalates_once_per_new_peak():
+    tracker = IncidentTracker(enter_frames=2, exit_frames=4)
+    events = feed(tracker, ["high", "high", "critical", "critical", "high"])
+    assert events == [(1, "start", 1), (2, "escalate", 1)]
+    assert tracker.active.peak_level == "critical"
+
+
+def test_elevated_holds_an_open_incident():
+    tracker = IncidentTracker(enter_frames=2, exit_frames=3)
+    events = feed(tracker, ["high", "high"] + ["elevated"] * 10)
+    assert events == [(1, "start", 1)]
+    assert tracker.active is not None
+
+
+def test_closes_after_exit_streak_at_last_hot_frame():
+    tracker = IncidentTracker(enter_frames=2, exit_frames=3)
+    levels = ["high", "high", "elevated", "normal", "normal", "very_low"]
+    assert feed(tracker, levels) == [(1, "start", 1), (5, "end", 1)]
+    assert tracker.active is None
+
+    ended = IncidentTracker(enter_frames=2, exit_frames=3)
+    for frame, level in enumerate(levels):
+        for event, incident in ended.update(level, 1.0, frame / 25.0, frame):
+            if event == "end":
+                assert incident.end_frame == 2
+                assert incident.frames == 3
+
+
+def test_calm_streak_resets_on_hot_frame():
+    tracker = IncidentTracker(enter_frames=1, exit_frames=3)
+    events = feed(tracker, ["high", "normal", "normal", "high", "normal", "normal", "normal"])
+    assert events == [(0, "start", 1), (6, "end", 1)]
+
+
+def test_reopens_with_next_id():
+    tracker = IncidentTracker(enter_frames=1, exit_frames=1)
+    events = feed(tracker, ["high", "normal", "critical", "normal"])
+    assert events == [(0, "start", 1), (1, "end", 1), (2, "start", 2), (3, "end", 2)]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from motion_engine import MotionEngine
+
+
+def still_frames(count, h=120, w=160):
+    frame = np.random.default_rng(0).integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+    return [frame.copy() for _ in range(count)]
+
+
+def run(engine, frames):
+    results = [engine.process(frame) for frame in frames]
+    assert results[0] is None
+    return results[1:]
+
+
+@pytest.mark.parametrize("force_every", [1, 3, 10])
+def test_force_every_runs_flow_after_gated_streak(force_every):
+    engine = MotionEngine(backend="framediff", density={"enabled": False},
+                          gate={"enabled": True, "floor": 1e9, "force_every": force_every})
+    gated = [m.gated for m in run(engine, still_frames(40))]
+    # force_every gated frames, then one with full flow, repeating
+    pattern = ([True] * force_every + [False]) * 40
+    assert gated == pattern[:len(gated)]
+
+
+def test_force_every_zero_gates_every_still_frame():
+    engine = MotionEngine(backend="framediff", density={"enabled": False},
+                          gate={"enabled": True, "floor": 1e9, "force_every": 0})
+    assert all(m.gated for m in run(engine, still_frames(30)))
+
+
+def test_gated_frames_report_zero_motion_and_keep_counting():
+    engine = MotionEngine(backend="framediff", density={"enabled": False},
+                          gate={"enabled": True, "floor": 1e9, "force_every": 4})
+    metrics = run(engine, still_frames(12))
+    assert [m.frame_number for m in metrics] == list(range(1, 12))
+    for m in metrics:
+        if m.gated:
+            assert m.avg_motion == 0.0
+            assert set(m.zones.values()) == {0.0}
+            assert m.change_score == 0.0
+
+
+def test_gate_floor_zero_never_gates():
+    engine = MotionEngine(backend="framediff", density={"enabled": False},
+                          gate={"enabled": True, "floor": 0.0, "force_every": 25})
+    metrics = run(engine, still_frames(10))
+    assert not any(m.gated for m in metrics)
+    assert all(m.change_score == 0.0 for m in metrics)
+
+
+def test_disabled_gate_has_no_score():
+    engine = MotionEngine(backend="framediff", density={"enabled": False}, gate={"enabled": False})
+    assert all(m.change_score is None and not m.gated for m in run(engine, still_frames(5)))
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from stats import BIN_WIDTH, StreamingStats
+
+
+def accumulate(values):
+    stats = StreamingStats()
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+def test_merge_matches_single_pass():
+    values = np.random.default_rng(0).gamma(2.0, 1.5, size=5000)
+    whole = accumulate(values)
+    merged = StreamingStats()
+    for part in np.array_split(values, 7):
+        merged.merge(accumulate(part))
+
+    assert merged.count == whole.count == len(values)
+    assert merged.mean == pytest.approx(whole.mean)
+    assert merged.variance == pytest.approx(whole.variance)
+    assert merged.min == whole.min and merged.max == whole.max
+    assert np.array_equal(merged.hist, whole.hist)
+
+
+def test_merge_with_empty_accumulators():
+    stats = accumulate([1.0, 2.0, 3.0])
+    assert StreamingStats().merge(stats).mean == pytest.approx(2.0)
+    assert stats.merge(StreamingStats()).count == 3
+
+
+def test_mean_and_variance_exact():
+    values = np.random.default_rng(1).uniform(0, 10, size=1000)
+    stats = accumulate(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.std == pytest.approx(values.std(ddof=1))
+
+
+@pytest.mark.parametrize("q", [1, 25, 50, 75, 95, 99, 99.9])
+def test_percentiles_within_one_bin(q):
+    values = np.random.default_rng(2).gamma(2.0, 1.5, size=20000)
+    stats = accumulate(values)
+    assert abs(stats.percentile(q) - np.percentile(values, q, method="inverted_cdf")) <= BIN_WIDTH
+
+
+def test_percentiles_clamped_to_observed_range():
+    stats = accumulate([5.0] * 10)
+    assert stats.percentile(0) == 5.0
+    assert stats.percentile(100) == 5.0
+    assert StreamingStats().percentile(50) == 0.0
+
+
+def test_mad():
+    values = np.random.default_rng(3).normal(10, 2, size=20000)
+    stats = accumulate(values)
+    expected = np.median(np.abs(values - np.median(values)))
+    assert abs(stats.mad - expected) <= 2 * BIN_WIDTH
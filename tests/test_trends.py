@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from trends import RESYNC_EVERY, MotionTrends, RollingWindow, window_frames, window_span
+
+
+def test_window_specs():
+    assert window_frames(5, 25) == 5
+    assert window_frames("2s", 25) == 50
+    assert window_frames("0.01s", 25) == 2
+    assert window_span("2s") == 2.0
+    assert window_span(5) is None
+
+
+def test_mean_and_slope_match_polyfit():
+    rng = np.random.default_rng(0)
+    window = RollingWindow(20)
+    xs = np.cumsum(rng.uniform(0.02, 0.2, size=300))
+    ys = 3.0 * xs + rng.normal(0, 0.5, size=300)
+    # Long enough to wrap the ring and resync the sums several times
+    assert len(xs) > 20 * RESYNC_EVERY
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        window.push(y, x)
+        lo = max(0, i - 19)
+        assert window.mean == pytest.approx(ys[lo:i + 1].mean())
+        if i >= 1:
+            expected = np.polyfit(xs[lo:i + 1], ys[lo:i + 1], 1)[0]
+            assert window.slope == pytest.approx(expected, rel=1e-6, abs=1e-9)
+
+
+def test_slope_defaults_to_per_push():
+    window = RollingWindow(5)
+    for value in [1.0, 3.0, 5.0, 7.0, 9.0, 11.0]:
+        window.push(value)
+    assert window.slope == pytest.approx(2.0)
+    assert list(window.values()) == [3.0, 5.0, 7.0, 9.0, 11.0]
+
+
+def test_slope_zero_until_two_samples_or_constant_x():
+    window = RollingWindow(5)
+    assert window.slope == 0.0
+    window.push(4.0, 1.0)
+    assert window.slope == 0.0
+    window.push(6.0, 1.0)
+    assert window.slope == 0.0
+
+
+def test_vector_window_matches_scalar_windows():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 5, size=(60, 3))
+    vector = RollingWindow(10, width=3)
+    scalars = [RollingWindow(10) for _ in range(3)]
+    for t, row in enumerate(values):
+        vector.push(row, t * 0.04)
+        for window, value in zip(scalars, row):
+            window.push(value, t * 0.04)
+    assert np.allclose(vector.mean, [w.mean for w in scalars])
+    assert np.allclose(vector.slope, [w.slope for w in scalars])
+
+
+def test_span_drops_samples_older_than_span():
+    window = RollingWindow(50, span=2.0)
+    for i in range(40):
+        window.push(float(i), i * 0.12)
+    # Samples within 2 s of the newest (4.68 s): 17 of them
+    assert window.count == 17
+    assert window.full
+    assert window.slope == pytest.approx(1.0 / 0.12)
+
+
+def test_motion_trends_slope_per_second_ignores_stride():
+    full = MotionTrends({"trend": "2s"}, fps=25)
+    strided = MotionTrends({"trend": "2s"}, fps=25)
+    for frame in range(200):
+        full.push(0.5 * frame / 25.0, frame / 25.0)
+        if frame % 3 == 0:
+            strided.push(0.5 * frame / 25.0, frame / 25.0)
+    assert full.slope_per_second("trend") == pytest.approx(0.5)
+    assert strided.slope_per_second("trend") == pytest.approx(0.5)
+
+
+def test_motion_trends_slope_zero_until_window_fills():
+    trends = MotionTrends({"trend": 10}, fps=25)
+    for frame in range(9):
+        trends.push(float(frame), frame / 25.0)
+        assert trends.slope_per_second("trend") == 0.0
+    trends.push(9.0, 9 / 25.0)
+    assert trends.slope_per_second("trend") == pytest.approx(25.0)
+
+
+def test_motion_trends_default_time_uses_fps():
+    trends = MotionTrends({"trend": 10}, fps=10)
+    for frame in range(10):
+        trends.push(float(frame))
+    assert trends.slope_per_second("trend") == pytest.approx(10.0)
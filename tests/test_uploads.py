@@ -0,0 +1,58 @@
+import io
+import os
+import time
+
+from uploads import load_upload_settings, prune_spool, spool_upload
+
+
+def spool_settings(tmp_path, **overrides):
+    return dict(load_upload_settings(), dir=str(tmp_path / "uploads"), **overrides)
+
+
+def add_file(folder, name, size, age):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_same_upload_is_reused(tmp_path):
+    settings = spool_settings(tmp_path)
+    path, digest, reused = spool_upload(io.BytesIO(b"clip"), settings)
+    again, digest2, reused2 = spool_upload(io.BytesIO(b"clip"), settings)
+    assert (again, digest2) == (path, digest)
+    assert not reused and reused2
+
+
+def test_over_budget_drops_least_recently_used(tmp_path):
+    settings = spool_settings(tmp_path, max_total_bytes=250)
+    folder = settings["dir"]
+    os.makedirs(folder)
+    oldest = add_file(folder, "a.mp4", 100, 300)
+    newer = add_file(folder, "b.mp4", 100, 200)
+    newest = add_file(folder, "c.mp4", 100, 100)
+    assert prune_spool(settings) == [oldest]
+    assert os.path.exists(newer) and os.path.exists(newest)
+
+
+def test_prune_spares_files_in_use(tmp_path):
+    settings = spool_settings(tmp_path, max_total_bytes=150, ttl=150)
+    folder = settings["dir"]
+    os.makedirs(folder)
+    stale = add_file(folder, "a.mp4", 100, 300)
+    older = add_file(folder, "b.mp4", 100, 100)
+    add_file(folder, "c.mp4", 100, 50)
+    removed = prune_spool(settings, keep=[os.path.abspath(stale), os.path.relpath(older)])
+    assert os.path.exists(stale) and os.path.exists(older)
+    assert removed == [os.path.join(folder, "c.mp4")]
+
+
+def test_upload_prune_spares_in_use(tmp_path):
+    settings = spool_settings(tmp_path, max_total_bytes=150)
+    folder = settings["dir"]
+    os.makedirs(folder)
+    watched = add_file(folder, "a.mp4", 100, 100)
+    path, _, _ = spool_upload(io.BytesIO(b"\1" * 100), settings, in_use={os.path.abspath(watched)})
+    assert os.path.exists(watched) and os.path.exists(path)
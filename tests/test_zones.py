@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from zones import MIN_ROI_SHARE, QUADRANT_NAMES, RegionOfInterest, ZoneLayout
+
+
+def random_image(h=90, w=160, seed=0):
+    return np.random.default_rng(seed).uniform(0, 4, size=(h, w)).astype(np.float32)
+
+
+def grid_edges(n, size):
+    return np.linspace(0, size, n + 1).round().astype(int)
+
+
+@pytest.mark.parametrize("grid", [(2, 2), (3, 4), (7, 5)])
+def test_grid_matches_slicing(grid):
+    mag = random_image()
+    rows, cols = grid
+    ys, xs = grid_edges(rows, mag.shape[0]), grid_edges(cols, mag.shape[1])
+    layout = ZoneLayout(grid)
+    motion, _ = layout.measure(mag)
+
+    expected = [float(mag[ys[r]:ys[r + 1], xs[c]:xs[c + 1]].mean()) for r in range(rows) for c in range(cols)]
+    assert list(motion) == layout.names
+    assert np.allclose(list(motion.values()), expected, rtol=1e-5)
+
+
+def test_two_by_two_keeps_quadrant_names():
+    assert ZoneLayout((2, 2)).names == QUADRANT_NAMES
+
+
+def test_grid_directions_match_mean_vector():
+    mag = random_image()
+    dx, dy = random_image(seed=1) - 2, random_image(seed=2) - 2
+    _, directions = ZoneLayout((2, 2)).measure(mag, (dx, dy))
+    top_left = np.degrees(np.arctan2(dy[:45, :80].sum(), dx[:45, :80].sum())) % 360
+    assert directions[QUADRANT_NAMES[0]] == pytest.approx(top_left, abs=1e-3)
+
+
+def test_polygons_match_slicing():
+    mag = random_image()
+    polygons = {
+        "gate": [[0.0, 0.0], [0.4, 0.0], [0.4, 0.4], [0.0, 0.4]],
+        "stage": [[0.6, 0.6], [1.0, 0.6], [1.0, 1.0], [0.6, 1.0]],
+    }
+    motion, _ = ZoneLayout(polygons=polygons).measure(mag)
+    # fillPoly includes the polygon's far edge pixels
+    assert motion["gate"] == pytest.approx(mag[:37, :65].mean(dtype=np.float64))
+    assert motion["stage"] == pytest.approx(mag[54:, 96:].mean(dtype=np.float64))
+
+
+def test_later_polygon_wins_overlap():
+    mag = np.zeros((100, 100), dtype=np.float32)
+    mag[:, 50:] = 1.0
+    polygons = {
+        "all": [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]],
+        "right": [[0.6, 0.0], [1.0, 0.0], [1.0, 1.0], [0.6, 1.0]],
+    }
+    motion, _ = ZoneLayout(polygons=polygons).measure(mag)
+    assert motion["right"] == pytest.approx(1.0)
+    assert 0.0 < motion["all"] < 1.0
+
+
+def test_roi_crop_and_mean_match_slicing():
+    frame = random_image()
+    roi = RegionOfInterest([[[0.25, 0.0], [0.75, 0.0], [0.75, 1.0], [0.25, 1.0]]])
+    crop = roi.crop(frame)
+    assert crop.flags["C_CONTIGUOUS"]
+    assert np.array_equal(crop, frame[:, 40:121])
+    assert roi.rectangular
+    assert roi.mean(crop) == pytest.approx(float(frame[:, 40:121].mean()), rel=1e-5)
+
+
+def test_roi_polygon_mean_only_counts_inside():
+    frame = np.zeros((100, 100), dtype=np.float32)
+    roi = RegionOfInterest([[[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]])
+    crop = roi.crop(frame + 1.0)
+    assert not roi.rectangular
+    assert roi.mean(crop) == pytest.approx(1.0)
+
+
+def test_grid_with_roi_matches_slicing():
+    mag = random_image(h=80, w=160)
+    # Left half of the frame: only the left quadrants are measured
+    roi = RegionOfInterest([[[0.0, 0.0], [0.5, 0.0], [0.5, 1.0], [0.0, 1.0]]])
+    crop = roi.crop(mag)
+    motion, _ = ZoneLayout((2, 2)).measure(crop, roi=roi)
+
+    assert motion[QUADRANT_NAMES[0]] == pytest.approx(float(mag[:40, :80].mean()), rel=1e-5)
+    assert motion[QUADRANT_NAMES[2]] == pytest.approx(float(mag[40:, :80].mean()), rel=1e-5)
+    # The ROI's closing edge column grazes the right quadrants
+    assert 1 / 80 < MIN_ROI_SHARE
+    assert motion[QUADRANT_NAMES[1]] == 0.0
+    assert motion[QUADRANT_NAMES[3]] == 0.0
@@ -0,0 +1,202 @@
+import numpy as np
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+
+# =========================
+# TREND WINDOWS
+# =========================
+# "trends.windows" in thresholds.json: name -> frames (5) or seconds
+# ("2s"). "smooth" feeds risk classification and spike detection,
+# "trend" the slope rule, "baseline" is the longer-term level logged
+# alongside.
+DEFAULT_WINDOWS = {"smooth": 5, "trend": "2s", "baseline": "30s"}
+RESYNC_EVERY = 8        # rebuild running sums from the buffer every N laps of the ring
+
+
+def load_trend_windows(path=THRESHOLDS_FILE, camera=None):
+    windows = dict(DEFAULT_WINDOWS)
+    windows.update(merged_section(load_config(path), "trends", camera).get("windows", {}))
+    return windows
+
+
+def window_frames(spec, fps):
+    """5 -> 5 frames; "2s" -> two seconds of frames at fps (at least 2)"""
+    if isinstance(spec, str) and spec.endswith("s"):
+        return max(2, int(round(float(spec[:-1]) * fps)))
+    return max(1, int(spec))
+
+
+def window_span(spec):
+    """"2s" -> 2.0 seconds; frame-count windows have no span (None)"""
+    if isinstance(spec, str) and spec.endswith("s"):
+        return float(spec[:-1])
+    return None
+
+
+# =========================
+# RING BUFFER
+# =========================
+class RollingWindow:
+    """
+    Ring buffer over one value (width=None) or a vector of `width` values
+    per step (e.g. every zone of a camera). push(value, x) is O(1) in the
+    window length: it keeps running sums for the mean and for a
+    least-squares slope of the values against x, plus an EWMA with
+    alpha = 2 / (size + 1).
+
+    x is where the sample sits, e.g. its time in seconds; it defaults to
+    the push count, so slope is per step. With span, samples span or
+    more behind the newest x are dropped as well, so a time window keeps
+    covering `span` seconds when samples arrive slower than planned
+    (dropped or strided frames) and size is only its capacity.
+
+    The slope is (n*Sxy - Sx*Sy) / (n*Sxx - Sx^2). Dropping a sample
+    subtracts its terms; x is kept relative to the oldest x at the last
+    resync, and the sums are rebuilt from the buffer every few laps so
+    float error cannot build up.
+    """
+
+    def __init__(self, size, width=None, alpha=None, span=None):
+        self.size = max(1, int(size))
+        self.scalar = width is None
+        self.span = span
+        shape = (self.size,) if self.scalar else (self.size, width)
+        self.buffer = np.zeros(shape, dtype=np.float64)
+        self.xs = np.zeros(self.size, dtype=np.float64)
+        self.alpha = alpha if alpha is not None else 2.0 / (self.size + 1)
+        self.reset()
+
+    def reset(self):
+        self.buffer[:] = 0.0
+        zero = 0.0 if self.scalar else np.zeros(self.buffer.shape[1])
+        self.head = 0
+        self.count = 0
+        self.pushes = 0
+        self.slid = False
+        self.x0 = None
+        self.sum_x = 0.0
+        self.sum_xx = 0.0
+        self.sum_y = zero
+        self.sum_xy = zero
+        self.ewma = None
+        self.last = zero
+
+    def _drop_oldest(self):
+        tail = (self.head - self.count) % self.size
+        x = self.xs[tail] - self.x0
+        y = float(self.buffer[tail]) if self.scalar else self.buffer[tail]
+        self.sum_x -= x
+        self.sum_xx -= x * x
+        self.sum_y = self.sum_y - y
+        self.sum_xy = self.sum_xy - x * y
+        self.count -= 1
+        self.slid = True
+
+    def push(self, value, x=None):
+        value = float(value) if self.scalar else np.asarray(value, dtype=np.float64)
+        x = float(self.pushes if x is None else x)
+        if self.x0 is None:
+            self.x0 = x
+        if self.count == self.size:
+            self._drop_oldest()
+        if self.span is not None:
+            while self.count and x - self.xs[(self.head - self.count) % self.size] >= self.span:
+                self._drop_oldest()
+
+        rx = x - self.x0
+        self.sum_x += rx
+        self.sum_xx += rx * rx
+        self.sum_y = self.sum_y + value
+        self.sum_xy = self.sum_xy + rx * value
+        self.buffer[self.head] = value
+        self.xs[self.head] = x
+        self.head = (self.head + 1) % self.size
+        self.count += 1
+        self.last = value
+        self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+
+        self.pushes += 1
+        if self.pushes % (self.size * RESYNC_EVERY) == 0:
+            self._resync()
+        return self
+
+    def _order(self):
+        return (self.head - self.count + np.arange(self.count)) % self.size
+
+    def _resync(self):
+        order = self._order()
+        ordered = self.buffer[order]
+        self.x0 = float(self.xs[order[0]])
+        x = self.xs[order] - self.x0
+        self.sum_x = float(x.sum())
+        self.sum_xx = float(x @ x)
+        self.sum_y = ordered.sum(axis=0)
+        self.sum_xy = x @ ordered
+        if self.scalar:
+            self.sum_y, self.sum_xy = float(self.sum_y), float(self.sum_xy)
+
+    def values(self):
+        """Buffered values, oldest first"""
+        return self.buffer[self._order()]
+
+    @property
+    def full(self):
+        """Filled to size, or already sliding (span windows fed slower than planned)"""
+        return self.count == self.size or self.slid
+
+    @property
+    def mean(self):
+        return self.sum_y / self.count if self.count else self.sum_y
+
+    @property
+    def slope(self):
+        """Least-squares change per unit of x over the buffered values (0 until two are in)"""
+        n = self.count
+        denominator = n * self.sum_xx - self.sum_x * self.sum_x
+        if n < 2 or denominator <= 1e-12 * max(1.0, n * self.sum_xx):
+            return 0.0 if self.scalar else np.zeros_like(self.sum_y)
+        return (n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+
+
+class MotionTrends:
+    """
+    The named windows of one stream (or of all its zones, with width),
+    all fed by the same push(). Windows are regressed against sample
+    time, so slopes are per second and "2s" windows cover two seconds of
+    footage whatever the stride, and also when a live capture drops
+    frames under load. Pass t = metrics.frame_number / source fps (frame
+    numbers count strided and dropped frames); without t samples are
+    taken to arrive at fps. fps also sizes the windows' capacity, so it
+    should be the fastest rate samples can arrive at.
+    """
+
+    def __init__(self, windows=None, fps=25.0, width=None):
+        self.fps = float(fps or 25.0)
+        self.windows = {name: RollingWindow(window_frames(spec, self.fps), width, span=window_span(spec))
+                        for name, spec in (windows or DEFAULT_WINDOWS).items()}
+        self.pushes = 0
+
+    def push(self, value, t=None):
+        if t is None:
+            t = self.pushes / self.fps
+        self.pushes += 1
+        for window in self.windows.values():
+            window.push(value, t)
+        return self
+
+    def __getitem__(self, name):
+        return self.windows[name]
+
+    def mean(self, name):
+        return self.windows[name].mean
+
+    def slope_per_second(self, name):
+        """
+        Least-squares slope of window `name` in motion units per second;
+        0 until the window has filled, so the first few frames of a
+        stream cannot fake a steep trend.
+        """
+        window = self.windows[name]
+        if not window.full:
+            return 0.0 if window.scalar else np.zeros_like(window.sum_y)
+        return window.slope
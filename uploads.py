@@ -0,0 +1,158 @@
+import hashlib
+import os
+import time
+import uuid
+
+from config import THRESHOLDS_FILE, load_config, merged_section
+
+# =========================
+# UPLOAD SPOOL
+# =========================
+# Uploaded videos are streamed into one managed folder instead of
+# NamedTemporaryFile(delete=False) copies that were never removed.
+# Files are named by content hash, so uploading the same clip twice
+# reuses the first copy.
+# The folder is pruned on every upload: files unused for ttl seconds go
+# first, then the least recently used until it fits in max_total_bytes.
+# Files the analysis service is still reading (in_use) are never removed.
+DEFAULT_SETTINGS = {
+    "dir": "uploads",
+    "max_file_bytes": 4 * 1024 ** 3,
+    "max_total_bytes": 20 * 1024 ** 3,
+    "ttl": 7 * 24 * 3600,
+    "chunk_bytes": 8 * 1024 ** 2,
+}
+PART_SUFFIX = ".part"
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def load_upload_settings(path=THRESHOLDS_FILE):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(merged_section(load_config(path), "uploads"))
+    return settings
+
+
+def _chunks(uploaded, chunk_bytes):
+    """
+    Zero-copy slices of an in-memory upload (Streamlit's UploadedFile is
+    a BytesIO) or plain reads from any other file object.
+    """
+    if hasattr(uploaded, "getbuffer"):
+        view = uploaded.getbuffer()
+        try:
+            for start in range(0, len(view), chunk_bytes):
+                yield view[start:start + chunk_bytes]
+        finally:
+            view.release()
+        return
+    uploaded.seek(0)
+    while True:
+        chunk = uploaded.read(chunk_bytes)
+        if not chunk:
+            break
+        yield chunk
+
+
+def spool_upload(uploaded, settings=None, in_use=()):
+    """
+    Streams an upload into the spool folder while hashing it. Returns
+    (path, digest, reused); reused is True when an identical clip was
+    already there. Raises UploadTooLarge past max_file_bytes. in_use
+    (paths being analysed) is spared by the prune that follows.
+    """
+    settings = settings or load_upload_settings()
+    folder = settings["dir"]
+    os.makedirs(folder, exist_ok=True)
+    limit = settings["max_file_bytes"]
+
+    size = getattr(uploaded, "size", None)
+    if limit and size is not None and size > limit:
+        raise UploadTooLarge(f"{size / 1e6:.0f} MB is over the {limit / 1e6:.0f} MB upload limit")
+
+    ext = os.path.splitext(getattr(uploaded, "name", "") or "")[1].lower()
+    part = os.path.join(folder, uuid.uuid4().hex + PART_SUFFIX)
+    digest = hashlib.blake2b(digest_size=16)
+    written = 0
+    try:
+        with open(part, "wb") as f:
+            for chunk in _chunks(uploaded, settings["chunk_bytes"]):
+                written += len(chunk)
+                if limit and written > limit:
+                    raise UploadTooLarge(f"Upload is over the {limit / 1e6:.0f} MB limit")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(part)
+        raise
+
+    digest = digest.hexdigest()
+    path = os.path.join(folder, digest + ext)
+    reused = os.path.exists(path)
+    if reused:
+        os.remove(part)
+        os.utime(path)
+    else:
+        os.replace(part, path)
+    prune_spool(settings, keep=[path, *in_use])
+    return path, digest, reused
+
+
+def spool_cached(uploaded, cache, settings=None, in_use=()):
+    """
+    spool_upload once per upload: Streamlit reruns the whole script on
+    every widget change, so `cache` (st.session_state works) remembers
+    which upload was already spooled and skips re-hashing it.
+    """
+    key = getattr(uploaded, "file_id", None) or (getattr(uploaded, "name", ""), getattr(uploaded, "size", None))
+    known = cache.get(key)
+    if known is not None and os.path.exists(known[0]):
+        os.utime(known[0])
+        return known[0], known[1], True
+    path, digest, reused = spool_upload(uploaded, settings, in_use)
+    cache[key] = (path, digest)
+    return path, digest, reused
+
+
+def prune_spool(settings=None, keep=()):
+    """
+    Drops stale files, then least-recently-used ones over max_total_bytes.
+    keep: paths never to remove (the file just uploaded, and any the
+    analysis service is still reading).
+    """
+    settings = settings or load_upload_settings()
+    folder = settings["dir"]
+    if not os.path.isdir(folder):
+        return []
+    keep = {os.path.normcase(os.path.abspath(p)) for p in keep}
+    now = time.time()
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    removed = []
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if os.path.normcase(os.path.abspath(path)) in keep:
+            continue
+        stale = settings["ttl"] and now - mtime > settings["ttl"]
+        # Abandoned partial uploads older than an hour
+        partial = path.endswith(PART_SUFFIX)
+        orphan = partial and now - mtime > 3600
+        over = not partial and settings["max_total_bytes"] and total > settings["max_total_bytes"]
+        if stale or orphan or over:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed.append(path)
+    return removed
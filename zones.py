@@ -0,0 +1,192 @@
+import cv2
+import numpy as np
+
+# =========================
+# ZONE NAMES
+# =========================
+# The 2x2 grid keeps the quadrant names app.py has always logged.
+QUADRANT_NAMES = [
+    "Zone 1 (Top-Left)",
+    "Zone 2 (Top-Right)",
+    "Zone 3 (Bottom-Left)",
+    "Zone 4 (Bottom-Right)",
+]
+
+
+def grid_names(rows, cols):
+    if (rows, cols) == (2, 2):
+        return list(QUADRANT_NAMES)
+    return [f"Zone R{r + 1}C{c + 1}" for r in range(rows) for c in range(cols)]
+
+
+def fraction_polygon(points, w, h):
+    """Polygon in 0..1 frame fractions -> int32 pixel points for cv2.fillPoly"""
+    return np.round(np.array(points, dtype=np.float32) * [w, h]).astype(np.int32)
+
+
+def resample_nearest(image, shape):
+    """Nearest-neighbour resize of a label / mask image (any dtype) to shape"""
+    if image.shape == shape:
+        return image
+    h, w = image.shape
+    rows = ((np.arange(shape[0]) + 0.5) * h / shape[0]).astype(int)
+    cols = ((np.arange(shape[1]) + 0.5) * w / shape[1]).astype(int)
+    return image[np.ix_(rows, cols)]
+
+
+# =========================
+# REGION OF INTEREST
+# =========================
+class RegionOfInterest:
+    """
+    Part of the frame that is analysed at all ("roi.polygons" in
+    thresholds.json, usually per camera; 0..1 frame fractions like zone
+    polygons). MotionEngine runs flow on the bounding box of the
+    polygons only and averages motion over the pixels inside them, so
+    sky, walls, overlays and traffic outside the venue cost nothing and
+    cannot raise the mean. Box and mask are built once per resolution.
+    No polygons means the whole frame.
+    """
+
+    def __init__(self, polygons=None):
+        self.polygons = [p for p in (polygons or []) if len(p) >= 3]
+        self.shape = None
+        self.masks = {}
+
+    def __bool__(self):
+        return bool(self.polygons)
+
+    def prepare(self, shape):
+        if shape == self.shape:
+            return
+        h, w = shape
+        full = np.zeros((h, w), dtype=np.uint8)
+        for points in self.polygons:
+            cv2.fillPoly(full, [fraction_polygon(points, w, h)], 255)
+        x, y, bw, bh = cv2.boundingRect(full)
+        if bw == 0 or bh == 0:
+            x, y, bw, bh = 0, 0, w, h
+            full[:] = 255
+        self.box = (slice(y, y + bh), slice(x, x + bw))
+        self.mask = full[self.box].copy()
+        self.rectangular = bool(self.mask.all())
+        self.area = cv2.countNonZero(self.mask)
+        self.masks = {self.mask.shape: self.mask}
+        self.shape = shape
+
+    def crop(self, gray):
+        """
+        The ROI's bounding box (prepares the mask for this resolution),
+        copied so DIS and other backends that reject non-contiguous
+        input get a dense array
+        """
+        self.prepare(gray.shape)
+        return np.ascontiguousarray(gray[self.box])
+
+    def mask_for(self, shape):
+        """The crop mask at another resolution (e.g. a sparse backend's point grid)"""
+        if shape not in self.masks:
+            self.masks[shape] = np.ascontiguousarray(resample_nearest(self.mask, shape))
+        return self.masks[shape]
+
+    def mean(self, image):
+        """Mean of a crop-aligned image over the pixels inside the polygons"""
+        if self.rectangular:
+            return float(np.mean(image))
+        return cv2.mean(image, mask=self.mask_for(image.shape))[0]
+
+
+# =========================
+# ZONE LAYOUT
+# =========================
+# Zones with less than this share of their area inside the region of
+# interest are left out (read 0) rather than measured on a sliver.
+MIN_ROI_SHARE = 0.05
+
+class ZoneLayout:
+    """
+    Splits the magnitude image into an N x M grid or into named
+    polygons and measures every zone in one vectorised pass.
+
+    Grid zones are summed from a single integral image, so a 16x16 grid
+    costs the same as 2x2. Polygon zones are rasterised once per
+    resolution into a label map and summed with one np.bincount; where
+    polygons overlap the later one wins. Polygon points are fractions of
+    the frame width / height (0..1) so they hold at any resolution.
+
+    With a RegionOfInterest, measure() takes crop-sized images: zones
+    stay laid out over the whole frame and only count pixels inside the
+    ROI (a zone entirely outside it reads 0).
+    """
+
+    def __init__(self, grid=(2, 2), polygons=None):
+        self.grid = tuple(grid)
+        self.polygons = dict(polygons or {})
+        self.names = list(self.polygons) if self.polygons else grid_names(*self.grid)
+        self.shape = None
+
+    def _label_map(self, h, w):
+        """Zone number (1..n, 0 = no zone) of every pixel of an h x w frame"""
+        if self.polygons:
+            labels = np.zeros((h, w), dtype=np.int32)
+            for label, points in enumerate(self.polygons.values(), start=1):
+                cv2.fillPoly(labels, [fraction_polygon(points, w, h)], label)
+            return labels
+        rows, cols = self.grid
+        row_of = np.searchsorted(np.linspace(0, h, rows + 1).round()[1:], np.arange(h), side="right")
+        col_of = np.searchsorted(np.linspace(0, w, cols + 1).round()[1:], np.arange(w), side="right")
+        return (row_of[:, None] * cols + col_of[None, :] + 1).astype(np.int32)
+
+    def _prepare(self, shape, roi=None):
+        key = (shape, roi.shape if roi else None)
+        if key == self.shape:
+            return
+        h, w = shape
+        self.labels = None
+        if roi:
+            # Label the whole frame, keep the ROI crop, drop pixels outside
+            # the mask and zones that only graze the ROI edge
+            full = self._label_map(*roi.shape)
+            labels = full[roi.box] * (roi.mask > 0)
+            counts = np.bincount(full.ravel(), minlength=len(self.names) + 1)
+            inside = np.bincount(labels.ravel(), minlength=len(self.names) + 1)
+            grazing = inside < MIN_ROI_SHARE * counts
+            grazing[0] = False
+            labels[grazing[labels]] = 0
+            self.labels = np.ascontiguousarray(resample_nearest(labels, shape)).ravel()
+        elif self.polygons:
+            self.labels = self._label_map(h, w).ravel()
+        if self.labels is not None:
+            self.areas = np.bincount(self.labels, minlength=len(self.names) + 1)[1:].astype(np.float64)
+        else:
+            rows, cols = self.grid
+            self.ys = np.linspace(0, h, rows + 1).round().astype(int)
+            self.xs = np.linspace(0, w, cols + 1).round().astype(int)
+            self.areas = np.outer(np.diff(self.ys), np.diff(self.xs)).ravel().astype(np.float64)
+        self.shape = key
+
+    def _sums(self, image):
+        """Per-zone sum of a single-channel float image"""
+        if self.labels is not None:
+            return np.bincount(self.labels, weights=image.ravel(), minlength=len(self.names) + 1)[1:]
+        s = cv2.integral(image)[self.ys][:, self.xs]
+        return (s[1:, 1:] - s[:-1, 1:] - s[1:, :-1] + s[:-1, :-1]).ravel()
+
+    def measure(self, mag, flow=None, roi=None):
+        """
+        flow is the backend's (dx, dy) component images or None.
+        Returns ({zone: mean motion}, {zone: direction in degrees}).
+        Direction is the angle of the zone's mean flow vector in image
+        coordinates (0 = right, 90 = down); it is empty when the backend
+        gives no flow vectors.
+        """
+        self._prepare(mag.shape, roi)
+        areas = np.maximum(self.areas, 1.0)
+        motion = dict(zip(self.names, (self._sums(mag) / areas).tolist()))
+
+        directions = {}
+        if flow is not None:
+            dx, dy = flow
+            angles = np.degrees(np.arctan2(self._sums(dy), self._sums(dx))) % 360
+            directions = dict(zip(self.names, angles.tolist()))
+        return motion, directions